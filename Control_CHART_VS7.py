@@ -1,178 +1,273 @@
-import streamlit as st
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from io import StringIO
-
-st.set_page_config(page_title="ActVal Processor & Control Chart", layout="wide")
-st.title("📊 ActVal Cleaner & Control Chart Analyzer")
-
-# Upload raw CSV file
-uploaded_file = st.sidebar.file_uploader("Upload raw ActVal.csv", type=["csv"])
-
-if uploaded_file:
-    try:
-        # Load the file (comma-separated)
-        df = pd.read_csv(uploaded_file, encoding='ascii', sep=',', on_bad_lines='skip')
-        st.success("✅ Successfully loaded CSV using comma separator")
-
-        # Check and convert 'Date' column
-        if 'Date' in df.columns:
-            df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-            df = df[~df['Date'].isna()]  # Remove rows with invalid dates
-            df.set_index('Date', inplace=True)
-        else:
-            st.error("❌ 'Date' column not found. Cannot continue.")
-            st.stop()
-
-        # Replace negative values in numeric columns with 0
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
-        for col in numeric_cols:
-            df[col] = df[col].apply(lambda x: 0 if pd.notnull(x) and x < 0 else x)
-
-        # Fill missing values
-        for col in df.columns:
-            if pd.api.types.is_numeric_dtype(df[col]):
-                df[col].fillna(0, inplace=True)
-            else:
-                df[col].fillna('', inplace=True)
-
-        # Ensure throughput column exists
-        throughput_col = 'Dosing station 1: Total throughput'
-        if throughput_col in df.columns:
-            df[throughput_col] = pd.to_numeric(df[throughput_col], errors='coerce').fillna(0)
-            df['Cumulative Throughput'] = df[throughput_col].cumsum()
-            st.success("✅ Cumulative Throughput column added")
-        else:
-            st.warning(f"Column '{throughput_col}' not found. Skipping cumulative throughput.")
-
-        # Download cleaned CSV
-        cleaned_csv = df.reset_index().to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="📥 Download Cleaned CSV",
-            data=cleaned_csv,
-            file_name="ActVal_cleaned.csv",
-            mime="text/csv"
-        )
-
-        # --- CONTROL CHART SECTION ---
-        st.header("📈 Generate Control Charts")
-
-        # Parameter groups
-        main_parameters = {
-            'Screw Speed': 'Extruder 1: Screw rotation speed',
-            'Torque': 'Extruder 1: Screw torque',
-            'Pressure': 'Extruder 1: Melt pressure 1',
-            'Throughput': 'Dosing station 1: Total throughput'
-        }
-
-        heating_zone_cols = [col for col in df.columns if 'Extruder 1: temperature zone' in col]
-        heating_zones = {
-            f'Heating Zone {col.split("zone")[-1].strip()}': col for col in heating_zone_cols
-        }
-
-        all_parameters = {**main_parameters, **heating_zones}
-
-        # Sidebar controls
-        param_display = st.sidebar.selectbox("Choose Parameter for Control Chart", list(all_parameters.keys()))
-        param_column = all_parameters[param_display]
-
-        # Time range slider
-        start_time, end_time = st.sidebar.slider(
-            "Select Time Range",
-            min_value=df.index.min().to_pydatetime(),
-            max_value=df.index.max().to_pydatetime(),
-            value=(df.index.min().to_pydatetime(), df.index.max().to_pydatetime()),
-            format="YYYY-MM-DD HH:mm"
-        )
-
-        # Filter data
-        df_filtered = df.loc[pd.Timestamp(start_time):pd.Timestamp(end_time)]
-        data = df_filtered[[param_column]].dropna()
-        series = data[param_column]
-
-        # Compute control chart statistics
-        mean = series.mean()
-        std = series.std()
-        ucl = mean + 3 * std
-        lcl = mean - 3 * std
-        if lcl < 0:
-            lcl = max(0, series[series > 0].min() if series[series > 0].size > 0 else 0)
-
-        points_above_ucl = (series > ucl).sum()
-        points_below_lcl = (series < lcl).sum()
-        total_points = len(series)
-        pct_out = (points_above_ucl + points_below_lcl) / total_points * 100 if total_points else 0
-
-        # --- Custom Label Annotation ---
-        st.sidebar.markdown("### 🏷️ Add Custom Event Label to Chart")
-        label_date = st.sidebar.date_input("Select Date for Label", value=start_time.date())
-        label_clock = st.sidebar.time_input("Select Time for Label", value=start_time.time())
-        label_text = st.sidebar.text_input("Enter Label Text", value="Custom Event")
-        label_time = pd.to_datetime(f"{label_date} {label_clock}")
-
-        # Plot the control chart
-        fig, ax = plt.subplots(figsize=(12, 6))
-        ax.plot(series.index, series, label=param_display, alpha=0.5)
-        ax.axhline(mean, color='black', linestyle='-', label=f'Mean = {mean:.2f}')
-        ax.axhline(ucl, color='red', linestyle='--', label=f'UCL = {ucl:.2f}')
-        ax.axhline(lcl, color='red', linestyle='--', label=f'LCL = {lcl:.2f}')
-        ax.plot(series[series > ucl].index, series[series > ucl], 'ro', label='Above UCL')
-        ax.plot(series[series < lcl].index, series[series < lcl], 'go', label='Below LCL')
-        ax.set_title(f'Control Chart for {param_display}')
-        ax.set_xlabel('Time')
-        ax.set_ylabel(param_display)
-        ax.legend(loc='best')
-
-        # Add label if valid
-        if label_text.strip() != "":
-            if label_time in series.index:
-                label_value = series.loc[label_time]
-                ax.annotate(
-                    label_text,
-                    xy=(label_time, label_value),
-                    xytext=(label_time, label_value + 0.05 * (ucl - lcl)),
-                    arrowprops=dict(facecolor='blue', shrink=0.05, width=1, headwidth=6),
-                    fontsize=9,
-                    color='blue',
-                    rotation=30,
-                    ha='left'
-                )
-            else:
-                st.sidebar.warning("⚠️ Selected time not in visible data range.")
-
-        # Format datetime axis
-        locator = mdates.AutoDateLocator()
-        formatter = mdates.ConciseDateFormatter(locator)
-        ax.xaxis.set_major_locator(locator)
-        ax.xaxis.set_major_formatter(formatter)
-        fig.autofmt_xdate()
-
-        st.pyplot(fig)
-
-        # Display stats
-        st.subheader("📊 Control Chart Statistics")
-        stats_df = pd.DataFrame({
-            'Statistic': ['Mean', 'Std Dev', 'UCL', 'LCL', 'Points Above UCL',
-                          'Points Below LCL', 'Total Points', 'Out of Control %'],
-            'Value': [f"{mean:.2f}", f"{std:.2f}", f"{ucl:.2f}", f"{lcl:.2f}",
-                      points_above_ucl, points_below_lcl, total_points, f"{pct_out:.2f}%"]
-        })
-
-        st.table(stats_df)
-
-        # Download stats
-        stats_csv = stats_df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="📥 Download Statistics CSV",
-            data=stats_csv,
-            file_name=f"{param_display.replace(' ', '_')}_stats.csv",
-            mime='text/csv'
-        )
-
-    except Exception as e:
-        st.error(f"❌ Error processing file: {e}")
-
-else:
-    st.info("📤 Upload a raw ActVal CSV file (comma-separated) to begin.")
+import streamlit as st
+import pandas as pd
+import os
+from matplotlib.figure import Figure
+from actval_ingest import (
+    compact_frame, content_hash, ensure_cleaned, export_cleaned, load_cleaned, memory_report, profile_parse,
+    EXPORT_FORMATS, EXPORT_SERVE_MAX_BYTES, MAIN_PARAMETERS, THROUGHPUT_COL, CUMULATIVE_COL
+)
+from control_chart import ChartCache, WindowIndex, draw_control_chart, render_png, stats_table
+from rollup import RollupPyramid
+from spc_rules import nelson_violations
+from instrumentation import session_profiler, show_profiler_panel
+
+st.set_page_config(page_title="ActVal Processor & Control Chart", layout="wide")
+
+
+# One cleaned frame per upload and column set, shared across reruns; treated as read-only.
+# Returned with its per-column memory usage before and after compacting.
+@st.cache_resource(max_entries=2, show_spinner="Parsing and cleaning ActVal file...")
+def load_actval(file_key, all_columns, engine, compact, _uploaded_file):
+    df = load_cleaned(_uploaded_file, file_key, all_columns=all_columns, engine=engine)
+    if not compact:
+        return df, memory_report(df, df)
+    compacted = compact_frame(df)
+    return compacted, memory_report(df, compacted)
+
+
+# Statistics index per (file, parameter), built once and reused by every slider move
+@st.cache_resource(max_entries=32, show_spinner="Indexing parameter...")
+def window_index(file_key, column, _df):
+    return WindowIndex(_df[column])
+
+
+# Time-bucket rollups per (file, parameter) for drawing long ranges
+@st.cache_resource(max_entries=32, show_spinner="Building rollups...")
+def rollup_pyramid(file_key, column, _df):
+    return RollupPyramid.from_frame(_df[[column]], columns=[column])
+
+
+# Rendered charts and their stats tables, shared by every session of this server
+@st.cache_resource
+def chart_cache():
+    return ChartCache()
+
+
+# Nelson rule counts for every parameter over one time window
+@st.cache_data(max_entries=16, show_spinner="Evaluating Nelson rules...")
+def nelson_table(file_key, start, end, columns, _df):
+    return nelson_violations(_df.loc[pd.Timestamp(start):pd.Timestamp(end)], columns)
+
+
+st.title("📊 ActVal Cleaner & Control Chart Analyzer")
+profiler = session_profiler("control_chart")
+
+# Upload raw CSV file
+uploaded_file = st.sidebar.file_uploader("Upload raw ActVal.csv", type=["csv"])
+
+if uploaded_file:
+    try:
+        # Only Date and the chart columns are parsed unless every column is asked for
+        load_all_columns = st.sidebar.checkbox("Load all columns (for the cleaned download)", value=False)
+        fast_parser = st.sidebar.checkbox("Fast parser (pyarrow engine, whole file in memory)", value=False)
+        engine = 'pyarrow' if fast_parser else 'c'
+        compact = st.sidebar.checkbox("Compact mode (float32 sensors, categorical text)", value=False)
+
+        # Load the file: chunked parse + vectorized cleaning, cached on disk by content hash.
+        # The hash is worked out once per upload (file_id), not on every rerun.
+        upload_hash = st.session_state.get("upload_hash")
+        if upload_hash is None or upload_hash[0] != uploaded_file.file_id:
+            with profiler.stage("hash upload"):
+                upload_hash = st.session_state["upload_hash"] = (uploaded_file.file_id, content_hash(uploaded_file))
+        file_key = upload_hash[1]
+        with profiler.stage("parse + clean (cached)") as rec:
+            df, memory = load_actval(file_key, load_all_columns, engine, compact, uploaded_file)
+            rec["rows"] = len(df)
+        # Per-parameter caches below depend on the stored precision as well as the file
+        data_key = f"{file_key}-compact" if compact else file_key
+        st.success("✅ Successfully loaded CSV using comma separator")
+        if not load_all_columns:
+            chart_column_count = sum(col != CUMULATIVE_COL for col in df.columns)
+            st.caption(f"Loaded Date and {chart_column_count} chart columns; tick 'Load all columns' for the rest.")
+
+        with st.expander("⏱️ Parse time and memory vs. the original parser"):
+            if st.button("Run parse comparison"):
+                with profiler.stage("parse comparison"):
+                    st.table(profile_parse(uploaded_file, all_columns=load_all_columns, engine=engine))
+
+        with st.expander(f"🧮 Memory usage: {memory.loc['Total', 'MB after']:.1f} MB"):
+            if compact:
+                st.caption("Before = cleaned float64/text frame, after = compact mode. "
+                           "Statistics are still computed in float64; downloads keep full precision.")
+            else:
+                st.caption("Tick 'Compact mode' to see the savings per column.")
+            st.dataframe(memory.round(2), use_container_width=True)
+
+        # Ensure throughput column exists
+        if CUMULATIVE_COL in df.columns:
+            st.success("✅ Cumulative Throughput column added")
+        else:
+            st.warning(f"Column '{THROUGHPUT_COL}' not found. Skipping cumulative throughput.")
+
+        # Download cleaned data: encoded only on request, then kept on disk next to the Parquet cache
+        export_format = st.selectbox("Cleaned download format", list(EXPORT_FORMATS))
+        if st.button("Prepare cleaned download"):
+            with profiler.stage(f"export {export_format}", rows=len(df)):
+                export_path = export_cleaned(
+                    ensure_cleaned(uploaded_file, file_key, load_all_columns, engine), export_format
+                )
+            extension, mime = EXPORT_FORMATS[export_format]
+            export_bytes = os.path.getsize(export_path)
+            if export_bytes > EXPORT_SERVE_MAX_BYTES:
+                # The download button would copy the whole file into server memory for this session
+                st.warning(f"⚠️ The {export_format} export is {export_bytes / 2**20:,.0f} MB, above the "
+                           f"{EXPORT_SERVE_MAX_BYTES / 2**20:,.0f} MB download limit. It is saved on the server at "
+                           f"`{os.path.abspath(export_path)}`; try a compressed format, or clean large runs "
+                           f"with `python actval_batch.py`.")
+            else:
+                with open(export_path, "rb") as export_file:
+                    st.download_button(
+                        label=f"📥 Download Cleaned {export_format}",
+                        data=export_file,
+                        file_name=f"ActVal_cleaned.{extension}",
+                        mime=mime
+                    )
+
+        # --- CONTROL CHART SECTION ---
+        st.header("📈 Generate Control Charts")
+
+        # Parameter groups
+        main_parameters = MAIN_PARAMETERS
+
+        heating_zone_cols = [col for col in df.columns if 'Extruder 1: temperature zone' in col]
+        heating_zones = {
+            f'Heating Zone {col.split("zone")[-1].strip()}': col for col in heating_zone_cols
+        }
+
+        all_parameters = {**main_parameters, **heating_zones}
+
+        # Sidebar controls
+        param_display = st.sidebar.selectbox("Choose Parameter for Control Chart", list(all_parameters.keys()))
+        param_column = all_parameters[param_display]
+
+        # Time range slider
+        start_time, end_time = st.sidebar.slider(
+            "Select Time Range",
+            min_value=df.index.min().to_pydatetime(),
+            max_value=df.index.max().to_pydatetime(),
+            value=(df.index.min().to_pydatetime(), df.index.max().to_pydatetime()),
+            format="YYYY-MM-DD HH:mm"
+        )
+        exact_plot = st.sidebar.checkbox("Exact plot (no downsampling)", value=False)
+
+        # --- Custom Label Annotation ---
+        st.sidebar.markdown("### 🏷️ Add Custom Event Label to Chart")
+        label_date = st.sidebar.date_input("Select Date for Label", value=start_time.date())
+        label_clock = st.sidebar.time_input("Select Time for Label", value=start_time.time())
+        label_text = st.sidebar.text_input("Enter Label Text", value="Custom Event")
+        label_time = pd.to_datetime(f"{label_date} {label_clock}")
+
+        def render_chart():
+            # Filter data
+            with profiler.stage("filter range") as rec:
+                series = df[param_column].loc[pd.Timestamp(start_time):pd.Timestamp(end_time)].dropna()
+                rec["rows"] = len(series)
+
+            # Compute control chart statistics from the per-parameter prefix-sum index
+            with profiler.stage("stats", rows=len(series)):
+                stats = window_index(data_key, param_column, df).window_stats(start_time, end_time)
+            ucl, lcl = stats['ucl'], stats['lcl']
+
+            # Plot the control chart
+            fig = Figure(figsize=(12, 6))
+            ax = fig.subplots()
+            width_px = int(fig.get_figwidth() * fig.dpi)
+            rollup_view = None
+            if not exact_plot:
+                # Long ranges come from the coarsest rollup level that still fills the figure width
+                with profiler.stage("rollup view", rows=len(series)):
+                    rollup_view = rollup_pyramid(data_key, param_column, df).view(param_column, start_time, end_time, width_px)
+            with profiler.stage("draw") as rec:
+                plotted = draw_control_chart(ax, series, stats, param_display, width_px, exact_plot, rollup_view)
+                rec["rows"] = len(plotted)
+
+            # Add label if valid
+            label_missing = False
+            if label_text.strip() != "":
+                if label_time in series.index:
+                    label_value = series.loc[label_time]
+                    ax.annotate(
+                        label_text,
+                        xy=(label_time, label_value),
+                        xytext=(label_time, label_value + 0.05 * (ucl - lcl)),
+                        arrowprops=dict(facecolor='blue', shrink=0.05, width=1, headwidth=6),
+                        fontsize=9,
+                        color='blue',
+                        rotation=30,
+                        ha='left'
+                    )
+                else:
+                    label_missing = True
+
+            fig.autofmt_xdate()
+
+            if rollup_view is not None:
+                caption = f"Plotted {len(rollup_view):,} {rollup_view.attrs['level']} buckets covering {len(series):,} points"
+            else:
+                caption = (f"Plotted {len(plotted):,} of {len(series):,} points"
+                           + ("" if exact_plot else " (min/max downsampled to figure width)"))
+            with profiler.stage("rasterize"):
+                png = render_png(fig)
+            chart = {'png': png, 'stats': stats_table(stats), 'caption': caption, 'label_missing': label_missing}
+            return chart, len(chart['png']) + int(chart['stats'].memory_usage(deep=True).sum())
+
+        # A view seen before (same data, parameter, range and label) is served from the chart cache;
+        # the label time only matters when there is a label to draw
+        cache = chart_cache()
+        label_key = (label_text.strip(), label_time) if label_text.strip() else None
+        with profiler.stage("control chart (cache lookup or render)"):
+            chart = cache.get_or_render(
+                (data_key, param_column, start_time, end_time, exact_plot, label_key),
+                render_chart
+            )
+        if chart['label_missing']:
+            st.sidebar.warning("⚠️ Selected time not in visible data range.")
+
+        with profiler.stage("st.image transfer"):
+            st.image(chart['png'], use_container_width=True)
+        st.caption(chart['caption'])
+        info = cache.info()
+        st.caption(f"Chart cache: {info['hits']} hits / {info['misses']} misses, {info['entries']} charts "
+                   f"in {info['bytes'] / 2**20:.1f} of {info['max_bytes'] / 2**20:.0f} MB")
+
+        # Display stats
+        st.subheader("📊 Control Chart Statistics")
+        stats_df = chart['stats']
+
+        st.table(stats_df)
+
+        # Download stats
+        stats_csv = stats_df.to_csv(index=False).encode('utf-8')
+        st.download_button(
+            label="📥 Download Statistics CSV",
+            data=stats_csv,
+            file_name=f"{param_display.replace(' ', '_')}_stats.csv",
+            mime='text/csv'
+        )
+
+        # --- NELSON RULES SECTION ---
+        st.subheader("🚦 Nelson Rule Violations (all parameters, selected time range)")
+        rule_columns = {name: col for name, col in all_parameters.items()
+                        if col in df.columns and pd.api.types.is_numeric_dtype(df[col])}
+        # A full scan of every parameter over the range, so it runs on request rather than on every
+        # slider move; the last result is kept for as long as the range stays the same
+        nelson_key = (data_key, start_time, end_time)
+        if st.button("Evaluate Nelson rules for this range"):
+            with profiler.stage("nelson rules (cached)", rows=len(df)):
+                violations = nelson_table(data_key, start_time, end_time, list(rule_columns.values()), df)
+            violations.columns = list(rule_columns.keys())
+            st.session_state["nelson_result"] = (nelson_key, violations)
+        nelson_result = st.session_state.get("nelson_result")
+        if nelson_result is not None and nelson_result[0] == nelson_key:
+            st.dataframe(nelson_result[1], use_container_width=True)
+        else:
+            st.caption("Scans every row of every parameter in the selected range; "
+                       "evaluate once the range is settled.")
+
+    except Exception as e:
+        st.error(f"❌ Error processing file: {e}")
+
+else:
+    st.info("📤 Upload a raw ActVal CSV file (comma-separated) to begin.")
+
+show_profiler_panel(profiler)
@@ -1,67 +1,100 @@
-import streamlit as st
-import pandas as pd
-from datetime import datetime
-
-# Initialize history
-if 'history' not in st.session_state:
-    st.session_state.history = []
-
-# Get last entry for pre-filling
-def get_last_entry():
-    if st.session_state.history:
-        return st.session_state.history[-1]
-    else:
-        return {
-            "Screw Speed": 0.0,
-            **{f"Zone {i+1}": 0.0 for i in range(10)},
-            "Die Temp": 0.0,
-            "Comments": ""
-        }
-
-# Navigation
-page = st.sidebar.selectbox("Choose a page", ["Input Page", "History Page"])
-
-if page == "Input Page":
-    st.title("Extruder Settings Input")
-    last_entry = get_last_entry()
-
-    with st.form("input_form"):
-        screw_speed = st.number_input("Screw Speed (rpm)", value=last_entry["Screw Speed"], step=0.1)
-
-        heating_zones = []
-        for i in range(10):
-            val = st.number_input(
-                f"Heating Zone {i+1} Temperature (°C)",
-                value=last_entry[f"Zone {i+1}"],
-                step=0.1
-            )
-            heating_zones.append(val)
-
-        die_temp = st.number_input("Die Temperature (°C)", value=last_entry["Die Temp"], step=0.1)
-
-        comments = st.text_area("Operator Comments", value="", height=200)
-
-        submitted = st.form_submit_button("Submit")
-
-    if submitted:
-        entry = {
-            "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "Screw Speed": screw_speed,
-            **{f"Zone {i+1}": temp for i, temp in enumerate(heating_zones)},
-            "Die Temp": die_temp,
-            "Comments": comments
-        }
-        st.session_state.history.append(entry)
-        st.success("Entry submitted successfully!")
-
-elif page == "History Page":
-    st.title("Input History")
-
-    if st.session_state.history:
-        df = pd.DataFrame(st.session_state.history)
-        st.dataframe(df, use_container_width=True)
-
-        csv = df.to_csv(index=False).encode("utf-8")
-        st.download_button("Download as CSV", csv, "input_history.csv", "text/csv")
-    else:
-        st.info("No input history available.")
+import streamlit as st
+import os
+from datetime import datetime, time
+from history_store import open_history_store, export_csv_bytes, DEFAULT_HISTORY_URL
+from instrumentation import session_profiler, show_profiler_panel
+
+history_page_size = 100
+
+
+# History is kept in a shared, persistent store (SQLite unless EXTRUDER_HISTORY_URL says otherwise)
+@st.cache_resource
+def get_history_store():
+    return open_history_store(os.environ.get("EXTRUDER_HISTORY_URL", DEFAULT_HISTORY_URL))
+
+# Get last entry for pre-filling
+def get_last_entry():
+    last_entry = get_history_store().last_entry()
+    if last_entry is not None:
+        return last_entry
+    else:
+        return {
+            "Screw Speed": 0.0,
+            **{f"Zone {i+1}": 0.0 for i in range(10)},
+            "Die Temp": 0.0,
+            "Comments": ""
+        }
+
+# Navigation
+page = st.sidebar.selectbox("Choose a page", ["Input Page", "History Page"])
+profiler = session_profiler("interaction")
+
+if page == "Input Page":
+    st.title("Extruder Settings Input")
+    with profiler.stage("load last entry", rows=1):
+        last_entry = get_last_entry()
+
+    with st.form("input_form"):
+        screw_speed = st.number_input("Screw Speed (rpm)", value=last_entry["Screw Speed"], step=0.1)
+
+        heating_zones = []
+        for i in range(10):
+            val = st.number_input(
+                f"Heating Zone {i+1} Temperature (°C)",
+                value=last_entry[f"Zone {i+1}"],
+                step=0.1
+            )
+            heating_zones.append(val)
+
+        die_temp = st.number_input("Die Temperature (°C)", value=last_entry["Die Temp"], step=0.1)
+
+        comments = st.text_area("Operator Comments", value="", height=200)
+
+        submitted = st.form_submit_button("Submit")
+
+    if submitted:
+        entry = {
+            "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "Screw Speed": screw_speed,
+            **{f"Zone {i+1}": temp for i, temp in enumerate(heating_zones)},
+            "Die Temp": die_temp,
+            "Comments": comments
+        }
+        with profiler.stage("store add", rows=1):
+            get_history_store().add(entry)
+        st.success("Entry submitted successfully!")
+
+elif page == "History Page":
+    st.title("Input History")
+    store = get_history_store()
+
+    # Filters are applied in the store, so only the visible page is loaded
+    filter_cols = st.columns(3)
+    date_range = filter_cols[0].date_input("Date range", value=())
+    comment_filter = filter_cols[1].text_input("Comments contain", value="")
+    start, end = None, None
+    if len(date_range) == 2:
+        start = datetime.combine(date_range[0], time.min)
+        end = datetime.combine(date_range[1], time.max)
+
+    with profiler.stage("count matching entries") as rec:
+        total_rows = store.count(start, end, comment_filter)
+        rec["rows"] = total_rows
+    if total_rows:
+        page_count = -(-total_rows // history_page_size)
+        page_number = filter_cols[2].number_input(f"Page (of {page_count})", min_value=1, max_value=page_count,
+                                                  value=page_count, step=1)
+        with profiler.stage("history page query") as rec:
+            df = store.page((page_number - 1) * history_page_size, history_page_size, start, end, comment_filter)
+            rec["rows"] = len(df)
+        st.dataframe(df, use_container_width=True)
+        st.caption(f"{total_rows:,} matching entries")
+
+        if st.button("Prepare CSV download"):
+            with profiler.stage("CSV export", rows=total_rows):
+                csv = export_csv_bytes(store, start, end, comment_filter)
+            st.download_button("Download as CSV", csv, "input_history.csv", "text/csv")
+    else:
+        st.info("No input history available.")
+
+show_profiler_panel(profiler)
@@ -1,195 +1,372 @@
-import streamlit as st
-import matplotlib.pyplot as plt
-import pandas as pd
-import numpy as np
-import os
-from datetime import datetime, timedelta
-import time
-
-st.set_page_config(page_title="Extruder Dashboard", layout="wide")
-
-# Sidebar Navigation
-page = st.sidebar.radio("Navigation", ["Extruder Diagram", "Temperature Chart", "Process Control QC Band", "Live SPC Monitoring"])
-
-# Default temperature profile for 10 zones (Celsius)
-default_temps = [180, 190, 200, 210, 220, 230, 230, 220, 210, 200]
-
-data_file = "extruder_data.csv"
-live_data_file = "live_spc_data.csv"
-
-# Initialize input storage
-zone_temps = []
-
-if page == "Extruder Diagram":
-    st.title("Extruder System Overview")
-
-    # Input boxes directly below extruder zones
-    st.subheader("Extruder Diagram with Zone Inputs")
-    fig, ax = plt.subplots(figsize=(12, 4))
-    ax.set_xlim(0, 15)
-    ax.set_ylim(0, 4)
-    ax.axis('off')
-
-    # Barrel
-    ax.add_patch(plt.Rectangle((2, 1.5), 10, 1, linewidth=2, edgecolor='black', facecolor='lightgrey'))
-
-    # Screw inside barrel
-    for i in range(40):
-        x = 2 + i * 0.25
-        y = 2
-        ax.add_patch(plt.Circle((x, y), 0.08, color='black'))
-
-    # Hopper
-    ax.add_patch(plt.Polygon([[1.5, 3], [2.5, 3], [2.2, 2.5], [1.8, 2.5]], closed=True, facecolor='blue', edgecolor='black'))
-    ax.text(1.6, 3.1, "Hopper", fontsize=9)
-
-    # Heating Zones
-    for i in range(10):
-        ax.add_patch(plt.Rectangle((2 + i, 1.3), 1, 1.4, linewidth=1, edgecolor='red', facecolor='none', linestyle='--'))
-        ax.text(2.5 + i, 2.9, f"Z{i+1}", fontsize=8, ha='center')
-
-    # Motor and Gearbox
-    ax.add_patch(plt.Rectangle((0.5, 1.7), 1, 0.6, linewidth=2, edgecolor='black', facecolor='gray'))
-    ax.text(0.55, 2.4, "Motor", fontsize=9)
-    ax.add_patch(plt.Rectangle((1.5, 1.7), 0.5, 0.6, linewidth=2, edgecolor='black', facecolor='darkgray'))
-    ax.text(1.55, 2.4, "Gearbox", fontsize=9)
-
-    # Die
-    ax.add_patch(plt.Rectangle((12.2, 1.7), 1, 0.6, linewidth=2, edgecolor='black', facecolor='orange'))
-    ax.text(12.3, 2.4, "Die", fontsize=9)
-
-    # Output product
-    ax.add_patch(plt.Rectangle((13.3, 1.9), 1.5, 0.2, linewidth=1, edgecolor='black', facecolor='green'))
-    ax.text(13.4, 2.2, "Extrudate", fontsize=9)
-
-    st.pyplot(fig)
-
-    # Input directly below diagram, aligned with zones
-    st.subheader("Enter Temperatures for Each Zone")
-    cols = st.columns(10)
-    for i, col in enumerate(cols):
-        temp = col.number_input(f"Z{i+1}", min_value=0, max_value=400, value=default_temps[i], step=1, key=f"zone_{i+1}")
-        zone_temps.append(temp)
-
-    screw_speed = st.number_input("Screw Speed (RPM)", min_value=0, max_value=500, value=50, step=1, key="screw_speed")
-    st.metric("Screw Speed", f"{screw_speed} RPM")
-
-    # Save button
-    if st.button("Save Data"):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        row = [timestamp] + zone_temps + [screw_speed]
-        columns = ["Timestamp"] + [f"Zone_{i+1}" for i in range(10)] + ["Screw_Speed"]
-
-        if not os.path.exists(data_file):
-            df = pd.DataFrame([row], columns=columns)
-        else:
-            df = pd.read_csv(data_file)
-            new_row = pd.DataFrame([row], columns=columns)
-            df = pd.concat([df, new_row], ignore_index=True)
-
-        df.to_csv(data_file, index=False)
-        st.success("Data saved successfully!")
-
-elif page == "Temperature Chart":
-    st.title("Temperature Profile Across Zones")
-    st.subheader("Visual Representation of Barrel Heating Zones")
-
-    # Recreate temperatures from session state
-    for i in range(10):
-        zone_temps.append(st.session_state.get(f"zone_{i+1}", default_temps[i]))
-
-    df = pd.DataFrame({"Zone": list(range(1, 11)), "Temperature (°C)": zone_temps})
-    df = df.set_index("Zone")
-    st.bar_chart(df)
-
-    # Show screw speed if exists
-    screw_speed = st.session_state.get("screw_speed", 50)
-    st.write(f"**Screw Speed:** {screw_speed} RPM")
-
-    # If data file exists, show QC band
-    if os.path.exists(data_file):
-        st.subheader("Quality Control Operating Band")
-        historical_df = pd.read_csv(data_file)
-        st.line_chart(historical_df[[f"Zone_{i+1}" for i in range(10)]])
-
-elif page == "Process Control QC Band":
-    st.title("Process Control Quality Bands")
-    st.subheader("Simulated Zone Readings Over Time")
-
-    # Simulate 60 minutes of data, once per minute
-    timestamps = [datetime.now() - timedelta(minutes=i) for i in range(59, -1, -1)]
-    data = {
-        "Timestamp": timestamps
-    }
-    for i in range(10):
-        base = default_temps[i]
-        data[f"Zone_{i+1}"] = base + np.random.normal(0, 2, 60)
-    data["Screw_Speed"] = 50 + np.random.normal(0, 2, 60)
-
-    df_sim = pd.DataFrame(data)
-    df_sim.set_index("Timestamp", inplace=True)
-
-    st.line_chart(df_sim[[f"Zone_{i+1}" for i in range(10)]])
-    st.line_chart(df_sim[["Screw_Speed"]])
-
-elif page == "Live SPC Monitoring":
-    st.title("Live SPC Monitoring: Heating Zones & Screw Speed")
-
-    # Load or initialize data
-    if os.path.exists(live_data_file):
-        df_live = pd.read_csv(live_data_file, parse_dates=["Timestamp"])
-    else:
-        df_live = pd.DataFrame(columns=["Timestamp"] + [f"Zone_{i+1}" for i in range(10)] + ["Screw_Speed"])
-
-    # Generate new data every 15 seconds and append to CSV
-    current_time = datetime.now()
-    if len(df_live) == 0 or (current_time - df_live.iloc[-1]["Timestamp"]).total_seconds() >= 15:
-        new_row = {
-            "Timestamp": current_time,
-            **{f"Zone_{i+1}": default_temps[i] + np.random.normal(0, 2) for i in range(10)},
-            "Screw_Speed": 50 + np.random.normal(0, 1)
-        }
-        df_live = pd.concat([df_live, pd.DataFrame([new_row])], ignore_index=True).tail(100)
-        df_live.to_csv(live_data_file, index=False)
-
-    df_live["Timestamp"] = pd.to_datetime(df_live["Timestamp"])
-    df_live.set_index("Timestamp", inplace=True)
-
-    # Show SPC charts
-    for i in range(10):
-        zone = f"Zone_{i+1}"
-        mean = df_live[zone].mean()
-        std = df_live[zone].std()
-        ucl = mean + 3 * std
-        lcl = mean - 3 * std
-
-        st.subheader(f"{zone} SPC Chart")
-        fig, ax = plt.subplots()
-        ax.plot(df_live.index, df_live[zone], label='Value')
-        ax.axhline(mean, color='green', linestyle='--', label='Mean')
-        ax.axhline(ucl, color='red', linestyle='--', label='UCL')
-        ax.axhline(lcl, color='red', linestyle='--', label='LCL')
-        ax.set_ylabel('Temperature (°C)')
-        ax.set_xlabel('Time')
-        ax.legend()
-        st.pyplot(fig)
-
-    # Screw Speed SPC Chart
-    mean_ss = df_live["Screw_Speed"].mean()
-    std_ss = df_live["Screw_Speed"].std()
-    ucl_ss = mean_ss + 3 * std_ss
-    lcl_ss = mean_ss - 3 * std_ss
-
-    st.subheader("Screw Speed SPC Chart")
-    fig, ax = plt.subplots()
-    ax.plot(df_live.index, df_live["Screw_Speed"], label='Screw Speed', color='purple')
-    ax.axhline(mean_ss, color='green', linestyle='--', label='Mean')
-    ax.axhline(ucl_ss, color='red', linestyle='--', label='UCL')
-    ax.axhline(lcl_ss, color='red', linestyle='--', label='LCL')
-    ax.set_ylabel('RPM')
-    ax.set_xlabel('Time')
-    ax.legend()
-    st.pyplot(fig)
-
-    st.toast("Updated with new data if 15 seconds have passed.", icon="🔄")
-    st.experimental_rerun()
+import streamlit as st
+import matplotlib.pyplot as plt
+import pandas as pd
+import numpy as np
+from datetime import datetime, timedelta
+import os
+import time
+import threading
+from extruder_store import ExtruderStore, ZONE_COLUMNS
+from live_spc import (
+    RingBuffer, LiveSampler, LiveChartPanel, FunctionSource, ActValReplaySource,
+    LIVE_CHANNELS, REPLAY_POLL_SECONDS, REPLAY_SPEEDUPS
+)
+from rollup import RollupPyramid
+from spc_rules import nelson_violations
+from multivariate_spc import MultivariateMonitor, AlarmChartPanel
+from instrumentation import session_profiler, show_profiler_panel
+
+st.set_page_config(page_title="Extruder Dashboard", layout="wide")
+
+# Sidebar Navigation
+page = st.sidebar.radio("Navigation", ["Extruder Diagram", "Temperature Chart", "Process Control QC Band", "Live SPC Monitoring"])
+profiler = session_profiler("extruder_dashboard")
+
+# Default temperature profile for 10 zones (Celsius)
+default_temps = [180, 190, 200, 210, 220, 230, 230, 220, 210, 200]
+
+data_file = "extruder_data.db"
+legacy_data_file = "extruder_data.csv"
+
+# Live SPC window size and sampling cadence
+live_window = 100
+live_sample_seconds = 15
+
+# Recorded ActVal CSVs that may be replayed on the Live page; only files in this directory are offered
+live_replay_dir = os.environ.get("LIVE_REPLAY_DIR", "replay_data")
+# A sampler nobody has looked at for this long is stopped
+live_monitor_idle_seconds = 300
+
+# Initialize input storage
+zone_temps = []
+
+# Approximate width of a full-width chart, used as the rollup pixel budget
+chart_pixels = 1200
+
+
+# Saved history lives in an append-only SQLite store; a legacy CSV is imported on first use
+@st.cache_resource
+def extruder_store():
+    store = ExtruderStore(data_file)
+    store.migrate_csv(legacy_data_file)
+    return store
+
+
+# Rollup of the saved history shared across sessions; each render only reads rows appended since the last one
+@st.cache_resource
+def history_rollup():
+    return {"lock": threading.Lock(), "last_id": 0, "pyramid": RollupPyramid(ZONE_COLUMNS + ["Screw_Speed"])}
+
+
+def refresh_history_rollup():
+    state = history_rollup()
+    with state["lock"]:
+        new_rows, state["last_id"] = extruder_store().read_after(state["last_id"])
+        state["pyramid"].extend(new_rows.set_index("Timestamp"))
+        return state["pyramid"]
+
+
+def simulate_live_sample():
+    row = [default_temps[i] + np.random.normal(0, 2) for i in range(10)] + [50 + np.random.normal(0, 1)]
+    return datetime.now(), row
+
+
+# One ring buffer and sampler thread per source configuration, shared by the Live SPC sessions
+# that use it, so one viewer changing source or replay speed/window never restarts another's.
+# Samplers left unused for live_monitor_idle_seconds are stopped.
+@st.cache_resource
+def live_monitors():
+    return {"lock": threading.Lock(), "monitors": {}}
+
+
+def live_monitor(config):
+    # config: ("simulated", window) or ("replay", window, path, speedup)
+    state = live_monitors()
+    now = time.time()
+    with state["lock"]:
+        monitors = state["monitors"]
+        for key in [k for k, m in monitors.items() if k != config and now - m["used"] > live_monitor_idle_seconds]:
+            monitors.pop(key)["sampler"].stop()
+        if config not in monitors:
+            window = config[1]
+            if config[0] == "replay":
+                source, interval = ActValReplaySource(config[2], speedup=config[3]), REPLAY_POLL_SECONDS
+            else:
+                source, interval = FunctionSource(simulate_live_sample), live_sample_seconds
+            buffer = RingBuffer(window, LIVE_CHANNELS)
+            # T² / EWMA / CUSUM see every sample; the ring buffer only the latest window
+            sampler = LiveSampler(buffer, source, interval, monitor=MultivariateMonitor(LIVE_CHANNELS))
+            sampler.start()
+            monitors[config] = {"buffer": buffer, "sampler": sampler}
+        monitors[config]["used"] = now
+        return monitors[config]["buffer"], monitors[config]["sampler"]
+
+
+def restart_live_monitor(config):
+    # Drop a stopped sampler (e.g. one whose source failed) so the next run starts it afresh
+    state = live_monitors()
+    with state["lock"]:
+        entry = state["monitors"].pop(config, None)
+    if entry is not None:
+        entry["sampler"].stop()
+
+
+if page == "Extruder Diagram":
+    st.title("Extruder System Overview")
+
+    # Input boxes directly below extruder zones
+    st.subheader("Extruder Diagram with Zone Inputs")
+    fig, ax = plt.subplots(figsize=(12, 4))
+    ax.set_xlim(0, 15)
+    ax.set_ylim(0, 4)
+    ax.axis('off')
+
+    # Barrel
+    ax.add_patch(plt.Rectangle((2, 1.5), 10, 1, linewidth=2, edgecolor='black', facecolor='lightgrey'))
+
+    # Screw inside barrel
+    for i in range(40):
+        x = 2 + i * 0.25
+        y = 2
+        ax.add_patch(plt.Circle((x, y), 0.08, color='black'))
+
+    # Hopper
+    ax.add_patch(plt.Polygon([[1.5, 3], [2.5, 3], [2.2, 2.5], [1.8, 2.5]], closed=True, facecolor='blue', edgecolor='black'))
+    ax.text(1.6, 3.1, "Hopper", fontsize=9)
+
+    # Heating Zones
+    for i in range(10):
+        ax.add_patch(plt.Rectangle((2 + i, 1.3), 1, 1.4, linewidth=1, edgecolor='red', facecolor='none', linestyle='--'))
+        ax.text(2.5 + i, 2.9, f"Z{i+1}", fontsize=8, ha='center')
+
+    # Motor and Gearbox
+    ax.add_patch(plt.Rectangle((0.5, 1.7), 1, 0.6, linewidth=2, edgecolor='black', facecolor='gray'))
+    ax.text(0.55, 2.4, "Motor", fontsize=9)
+    ax.add_patch(plt.Rectangle((1.5, 1.7), 0.5, 0.6, linewidth=2, edgecolor='black', facecolor='darkgray'))
+    ax.text(1.55, 2.4, "Gearbox", fontsize=9)
+
+    # Die
+    ax.add_patch(plt.Rectangle((12.2, 1.7), 1, 0.6, linewidth=2, edgecolor='black', facecolor='orange'))
+    ax.text(12.3, 2.4, "Die", fontsize=9)
+
+    # Output product
+    ax.add_patch(plt.Rectangle((13.3, 1.9), 1.5, 0.2, linewidth=1, edgecolor='black', facecolor='green'))
+    ax.text(13.4, 2.2, "Extrudate", fontsize=9)
+
+    with profiler.stage("st.pyplot diagram"):
+        st.pyplot(fig)
+
+    # Input directly below diagram, aligned with zones
+    st.subheader("Enter Temperatures for Each Zone")
+    cols = st.columns(10)
+    for i, col in enumerate(cols):
+        temp = col.number_input(f"Z{i+1}", min_value=0, max_value=400, value=default_temps[i], step=1, key=f"zone_{i+1}")
+        zone_temps.append(temp)
+
+    screw_speed = st.number_input("Screw Speed (RPM)", min_value=0, max_value=500, value=50, step=1, key="screw_speed")
+    st.metric("Screw Speed", f"{screw_speed} RPM")
+
+    # Save button
+    if st.button("Save Data"):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        row = [timestamp] + zone_temps + [screw_speed]
+        with profiler.stage("store append", rows=1):
+            extruder_store().append(row)
+        st.success("Data saved successfully!")
+
+elif page == "Temperature Chart":
+    st.title("Temperature Profile Across Zones")
+    st.subheader("Visual Representation of Barrel Heating Zones")
+
+    # Recreate temperatures from session state
+    for i in range(10):
+        zone_temps.append(st.session_state.get(f"zone_{i+1}", default_temps[i]))
+
+    df = pd.DataFrame({"Zone": list(range(1, 11)), "Temperature (°C)": zone_temps})
+    df = df.set_index("Zone")
+    st.bar_chart(df)
+
+    # Show screw speed if exists
+    screw_speed = st.session_state.get("screw_speed", 50)
+    st.write(f"**Screw Speed:** {screw_speed} RPM")
+
+    # If saved history exists, show QC band
+    store = extruder_store()
+    first_saved, last_saved = store.bounds()
+    if first_saved is not None:
+        st.subheader("Quality Control Operating Band")
+        history_range = st.date_input(
+            "History range",
+            value=(first_saved.date(), last_saved.date()),
+            min_value=first_saved.date(),
+            max_value=last_saved.date()
+        )
+        if len(history_range) == 2:
+            range_start = pd.Timestamp(history_range[0])
+            range_end = pd.Timestamp(history_range[1]) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+            with profiler.stage("refresh history rollup"):
+                pyramid = refresh_history_rollup()
+            level = pyramid.select(range_start, range_end, chart_pixels)
+            if level is None:
+                with profiler.stage("read history range") as rec:
+                    historical_df = store.read_range(range_start, range_end)
+                    rec["rows"] = len(historical_df)
+                with profiler.stage("line chart", rows=len(historical_df)):
+                    st.line_chart(historical_df[ZONE_COLUMNS])
+            else:
+                # Long histories are drawn from bucket means at the coarsest level that fills the chart
+                with profiler.stage(f"rollup view ({level})") as rec:
+                    band = pd.DataFrame({
+                        zone: pyramid.view(zone, range_start, range_end, chart_pixels)["mean"] for zone in ZONE_COLUMNS
+                    })
+                    rec["rows"] = len(band)
+                with profiler.stage("line chart", rows=len(band)):
+                    st.line_chart(band)
+                st.caption(f"Showing {len(band):,} {level} bucket means")
+
+elif page == "Process Control QC Band":
+    st.title("Process Control Quality Bands")
+    st.subheader("Simulated Zone Readings Over Time")
+
+    # Simulate 60 minutes of data, once per minute
+    timestamps = [datetime.now() - timedelta(minutes=i) for i in range(59, -1, -1)]
+    data = {
+        "Timestamp": timestamps
+    }
+    for i in range(10):
+        base = default_temps[i]
+        data[f"Zone_{i+1}"] = base + np.random.normal(0, 2, 60)
+    data["Screw_Speed"] = 50 + np.random.normal(0, 2, 60)
+
+    df_sim = pd.DataFrame(data)
+    df_sim.set_index("Timestamp", inplace=True)
+
+    st.line_chart(df_sim[[f"Zone_{i+1}" for i in range(10)]])
+    st.line_chart(df_sim[["Screw_Speed"]])
+
+elif page == "Live SPC Monitoring":
+    st.title("Live SPC Monitoring: Heating Zones & Screw Speed")
+
+    chart_mode = st.sidebar.radio("Charts", ["Multivariate alarm chart (T², EWMA, CUSUM)", "Per-channel SPC charts"])
+    multivariate = chart_mode.startswith("Multivariate")
+    combined_charts = not multivariate and st.sidebar.checkbox("Single multi-panel figure", value=False)
+
+    # A recorded ActVal file can be replayed faster than real time to stress-test this page
+    source_kind = st.sidebar.radio("Live data source", ["Simulated", "Replay ActVal CSV"])
+    refresh_seconds = live_sample_seconds
+    monitor_config = ("simulated", live_window)
+    if source_kind == "Replay ActVal CSV":
+        replay_files = sorted(f for f in os.listdir(live_replay_dir)
+                              if f.lower().endswith(".csv")) if os.path.isdir(live_replay_dir) else []
+        default_file = os.environ.get("LIVE_REPLAY_FILE", "")
+        replay_file = st.sidebar.selectbox("Recorded ActVal CSV", replay_files,
+                                           index=replay_files.index(default_file) if default_file in replay_files else 0)
+        replay_speedup = st.sidebar.select_slider("Replay speed-up", options=REPLAY_SPEEDUPS, value=100,
+                                                  format_func=lambda x: f"{x}×")
+        replay_window = st.sidebar.number_input("Window (samples)", min_value=10, max_value=100000,
+                                                value=live_window, step=10)
+        refresh_seconds = st.sidebar.number_input("Chart refresh (s)", min_value=0.2, max_value=60.0,
+                                                  value=1.0, step=0.2)
+        monitor_config = None
+        if replay_file is None:
+            st.info(f"No ActVal CSVs to replay. Put recorded files in '{live_replay_dir}' on the server "
+                    f"(or set LIVE_REPLAY_DIR).")
+        else:
+            monitor_config = ("replay", int(replay_window), os.path.join(live_replay_dir, replay_file), replay_speedup)
+            try:
+                live_monitor(monitor_config)
+            except ValueError as e:
+                st.error(f"❌ Cannot replay file: {e}")
+                monitor_config = None
+
+    # Redrawn on a timer that matches the sampler cadence; the rest of the page is not rerun
+    @st.fragment(run_every=refresh_seconds)
+    def live_spc_charts():
+        buffer, sampler = live_monitor(monitor_config)
+        if sampler.error is not None:
+            st.error(f"❌ Live source stopped: {type(sampler.error).__name__}: {sampler.error}")
+            if st.button("Restart live source"):
+                restart_live_monitor(monitor_config)
+                st.rerun()
+        times, values, means, stds = buffer.snapshot()
+        version, last_due = buffer.version, buffer.last_due
+        df_live = pd.DataFrame(values, index=pd.DatetimeIndex(times, name="Timestamp"), columns=LIVE_CHANNELS)
+
+        if multivariate:
+            # One combined chart from the streaming monitor instead of one chart per channel
+            monitor = sampler.monitor
+            mv_times, t2, codes, z, counts = monitor.snapshot()
+            panel = st.session_state.get("live_alarm_panel")
+            if panel is None:
+                panel = st.session_state["live_alarm_panel"] = AlarmChartPanel(LIVE_CHANNELS, monitor.ucl)
+
+            render_start = time.perf_counter()
+            with profiler.stage("update alarm chart", rows=len(mv_times)):
+                panel.update(mv_times, t2, codes, monitor.ucl)
+            with profiler.stage("st.pyplot alarm chart", rows=len(mv_times)):
+                st.pyplot(panel.figure, clear_figure=False)
+            panel.record_render((time.perf_counter() - render_start) * 1000)
+            if monitor.n < monitor.warmup:
+                st.caption(f"Learning the in-control covariance: {monitor.n} of {monitor.warmup} samples.")
+            st.caption(f"T² alarms so far: {counts['t2']:,} of {max(monitor.n - monitor.warmup, 0):,} scored samples")
+            st.dataframe(monitor.summary(codes, z, counts), use_container_width=True)
+        else:
+            # Figures and artists are built once per session and only updated on refresh
+            panel = st.session_state.get("live_chart_panel")
+            if panel is None or panel.combined != combined_charts:
+                panel = LiveChartPanel(
+                    LIVE_CHANNELS,
+                    titles=[f"{zone} SPC Chart" for zone in ZONE_COLUMNS] + ["Screw Speed SPC Chart"],
+                    ylabels=['Temperature (°C)'] * 10 + ['RPM'],
+                    colors=['C0'] * 10 + ['purple'],
+                    combined=combined_charts
+                )
+                st.session_state["live_chart_panel"] = panel
+
+            render_start = time.perf_counter()
+            with profiler.stage("update live artists", rows=len(times)):
+                panel.update(times, values, means, stds)
+            with profiler.stage("st.pyplot live charts", rows=len(times)):
+                if panel.combined:
+                    st.pyplot(panel.figures[0], clear_figure=False)
+                else:
+                    # Show SPC charts
+                    for title, fig in zip(panel.titles, panel.figures):
+                        st.subheader(title)
+                        st.pyplot(fig, clear_figure=False)
+            panel.record_render((time.perf_counter() - render_start) * 1000)
+
+        # Nelson rules over every live channel in one pass
+        st.subheader("Nelson Rule Violations")
+        with profiler.stage("nelson rules", rows=len(df_live)):
+            violations = nelson_violations(df_live, LIVE_CHANNELS)
+        st.dataframe(violations, use_container_width=True)
+
+        st.caption(f"{buffer.size} samples in window · next sample in "
+                   f"{max(sampler.next_sample_at - time.time(), 0):.0f} s · "
+                   f"render {panel.render_ms[-1]:.0f} ms (avg {np.mean(panel.render_ms):.0f} ms "
+                   f"over {len(panel.render_ms)} refreshes)")
+
+        # Throughput report: samples that scrolled out between two refreshes were never drawn
+        seen = st.session_state.get("live_seen")
+        if seen is None or seen["sampler"] is not sampler:
+            seen = st.session_state["live_seen"] = {"sampler": sampler, "version": 0, "never_drawn": 0}
+        seen["never_drawn"] += max(version - seen["version"] - buffer.capacity, 0)
+        seen["version"] = version
+        source = sampler.source
+        lag = list(sampler.ingest_lag)
+        end_to_end = time.time() - last_due if last_due is not None else float("nan")
+        st.caption(f"Source: {source.name} · {sampler.rate():,.0f} samples/s · "
+                   f"ingest lag {np.median(lag) * 1000 if lag else float('nan'):.0f} ms median, "
+                   f"{max(lag, default=float('nan')) * 1000:.0f} ms max · end-to-end lag {end_to_end:.2f} s · "
+                   f"dropped at source {source.dropped:,} · never drawn {seen['never_drawn']:,} "
+                   f"of {sampler.delivered:,} delivered")
+        if getattr(source, "missing_channels", None):
+            st.caption(f"Not in the replayed file (fed as 0): {', '.join(source.missing_channels)}")
+        if source.finished:
+            st.caption("Replay finished.")
+
+    if monitor_config is not None:
+        live_spc_charts()
+
+show_profiler_panel(profiler)
@@ -1,104 +1,171 @@
-import streamlit as st
-import pandas as pd
-from datetime import datetime
-import gspread
-from google.oauth2.service_account import Credentials
-
-# --- Set page config with icon and title ---
-st.set_page_config(
-    page_title="Extruder Logbook",
-    page_icon="Favicon.png",  # Must be in same folder as this script
-    layout="wide"
-)
-
-# --- Google Sheets Setup ---
-def get_gsheet_connection():
-    scope = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = Credentials.from_service_account_info(st.secrets["gsheets"], scopes=scope)
-    client = gspread.authorize(creds)
-    sheet = client.open("ExtruderLog").sheet1
-    ensure_headers_exist(sheet)
-    return sheet
-
-def ensure_headers_exist(sheet):
-    expected_headers = (
-        ["Timestamp", "Screw Speed"] +
-        [f"Zone {i+1}" for i in range(10)] +
-        ["Die Temp", "Comments"]
-    )
-    current = sheet.row_values(1)
-    if current != expected_headers:
-        sheet.delete_rows(1)
-        sheet.insert_row(expected_headers, index=1)
-
-def save_to_gsheet(entry):
-    sheet = get_gsheet_connection()
-    sheet.append_row(list(entry.values()))
-
-def load_history_from_gsheet():
-    sheet = get_gsheet_connection()
-    records = sheet.get_all_records()
-    return pd.DataFrame(records)
-
-def get_last_entry(df):
-    if not df.empty:
-        return df.iloc[-1].to_dict()
-    else:
-        return {
-            "Timestamp": "",
-            "Screw Speed": 0.0,
-            **{f"Zone {i+1}": 0.0 for i in range(10)},
-            "Die Temp": 0.0,
-            "Comments": ""
-        }
-
-# --- Streamlit UI ---
-page = st.sidebar.selectbox("Choose a page", ["Input Page", "History Page"])
-
-if page == "Input Page":
-    st.title("Extruder Settings Input")
-
-    df_history = load_history_from_gsheet()
-    last_entry = get_last_entry(df_history)
-
-    with st.form("input_form"):
-        screw_speed = st.number_input("Screw Speed (rpm)", value=float(last_entry.get("Screw Speed", 0.0)), step=0.1)
-
-        heating_zones = []
-        for i in range(10):
-            val = st.number_input(
-                f"Heating Zone {i+1} Temperature (°C)",
-                value=float(last_entry.get(f"Zone {i+1}", 0.0)),
-                step=0.1
-            )
-            heating_zones.append(val)
-
-        die_temp = st.number_input("Die Temperature (°C)", value=float(last_entry.get("Die Temp", 0.0)), step=0.1)
-        comments = st.text_area("Operator Comments", height=200)
-
-        submitted = st.form_submit_button("Submit")
-
-    if submitted:
-        entry = {
-            "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "Screw Speed": screw_speed,
-            **{f"Zone {i+1}": temp for i, temp in enumerate(heating_zones)},
-            "Die Temp": die_temp,
-            "Comments": comments
-        }
-        save_to_gsheet(entry)
-        st.success("Entry submitted and saved to Google Sheets!")
-
-elif page == "History Page":
-    st.title("Input History")
-    df_history = load_history_from_gsheet()
-
-    if not df_history.empty:
-        st.dataframe(df_history, use_container_width=True)
-        csv = df_history.to_csv(index=False).encode("utf-8")
-        st.download_button("Download as CSV", csv, "input_history.csv", "text/csv")
-    else:
-        st.info("No history found.")
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+import os
+from gsheet_client import SheetClient, FakeWorksheet, connect_gspread, EXPECTED_HEADERS
+from logbook_mirror import LogbookMirror
+from logbook_queue import SubmissionQueue, FlushWorker
+from instrumentation import session_profiler, show_profiler_panel
+
+# --- Set page config with icon and title ---
+st.set_page_config(
+    page_title="Extruder Logbook",
+    page_icon="Favicon.png",  # Must be in same folder as this script
+    layout="wide"
+)
+
+mirror_file = "logbook_mirror.db"
+queue_file = "logbook_queue.db"
+history_page_size = 100
+
+# --- Google Sheets Setup ---
+# One client, worksheet handle and header check per server process, shared by all sessions.
+# Set LOGBOOK_FAKE_SHEETS_LATENCY (seconds) to run against an in-memory sheet offline.
+@st.cache_resource
+def get_sheet_client():
+    fake_latency = os.environ.get("LOGBOOK_FAKE_SHEETS_LATENCY")
+    if fake_latency is not None:
+        fake_sheet = FakeWorksheet(latency=float(fake_latency))
+        return SheetClient(lambda: fake_sheet)
+    return SheetClient(lambda: connect_gspread(st.secrets["gsheets"]))
+
+# Local mirror of the sheet, synced incrementally (only rows past the last mirrored one)
+@st.cache_resource
+def get_log_mirror():
+    return LogbookMirror(mirror_file)
+
+# Submissions are journaled locally and appended to the sheet in batches by a background worker
+@st.cache_resource
+def get_submission_queue():
+    queue = SubmissionQueue(queue_file)
+    worker = FlushWorker(
+        queue,
+        get_sheet_client(),
+        existing_ids=lambda entry_ids: get_log_mirror().existing_ids(get_sheet_client(), entry_ids),
+        on_flushed=lambda: get_log_mirror().sync(get_sheet_client(), force=True)
+    )
+    worker.start()
+    return queue, worker
+
+def save_to_gsheet(entry):
+    queue, worker = get_submission_queue()
+    queue.enqueue(entry.values())
+    worker.wake()
+    return queue.depth()
+
+def sync_history():
+    # Sheets being unreachable never blocks the page: the local mirror (plus the queue for
+    # entries not yet uploaded) is shown instead
+    with profiler.stage("sync mirror from Sheets") as rec:
+        try:
+            rec["rows"] = get_log_mirror().sync(get_sheet_client())
+        except Exception as e:
+            st.warning(f"⚠️ Google Sheets unreachable, showing the local copy: {e}")
+    return get_log_mirror()
+
+def get_last_entry(mirror):
+    # Entries still waiting in the queue are newer than anything in the sheet
+    unsent = get_submission_queue()[0].last_unsent()
+    last_entry = dict(zip(EXPECTED_HEADERS, unsent)) if unsent else mirror.last_entry()
+    if last_entry is not None:
+        return last_entry
+    else:
+        return {
+            "Timestamp": "",
+            "Screw Speed": 0.0,
+            **{f"Zone {i+1}": 0.0 for i in range(10)},
+            "Die Temp": 0.0,
+            "Comments": ""
+        }
+
+# --- Streamlit UI ---
+page = st.sidebar.selectbox("Choose a page", ["Input Page", "History Page"])
+profiler = session_profiler("logbook")
+
+if page == "Input Page":
+    st.title("Extruder Settings Input")
+
+    last_entry = get_last_entry(sync_history())
+
+    with st.form("input_form"):
+        screw_speed = st.number_input("Screw Speed (rpm)", value=float(last_entry.get("Screw Speed", 0.0)), step=0.1)
+
+        heating_zones = []
+        for i in range(10):
+            val = st.number_input(
+                f"Heating Zone {i+1} Temperature (°C)",
+                value=float(last_entry.get(f"Zone {i+1}", 0.0)),
+                step=0.1
+            )
+            heating_zones.append(val)
+
+        die_temp = st.number_input("Die Temperature (°C)", value=float(last_entry.get("Die Temp", 0.0)), step=0.1)
+        comments = st.text_area("Operator Comments", height=200)
+
+        submitted = st.form_submit_button("Submit")
+
+    if submitted:
+        entry = {
+            "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "Screw Speed": screw_speed,
+            **{f"Zone {i+1}": temp for i, temp in enumerate(heating_zones)},
+            "Die Temp": die_temp,
+            "Comments": comments
+        }
+        with profiler.stage("enqueue submission", rows=1):
+            pending = save_to_gsheet(entry)
+        st.success(f"Entry submitted and saved locally; {pending} pending upload to Google Sheets.")
+
+elif page == "History Page":
+    st.title("Input History")
+    mirror = sync_history()
+    total_rows = mirror.count()
+
+    if total_rows:
+        page_count = -(-total_rows // history_page_size)
+        page_number = st.number_input(f"Page (of {page_count}, {history_page_size} rows each)",
+                                      min_value=1, max_value=page_count, value=page_count, step=1)
+        with profiler.stage("history page query") as rec:
+            history_page = mirror.page(page_number - 1, history_page_size)
+            rec["rows"] = len(history_page)
+        st.dataframe(history_page, use_container_width=True)
+        st.caption(f"{total_rows:,} entries in total")
+        if st.button("Prepare CSV download"):
+            with profiler.stage("CSV export", rows=total_rows):
+                history_csv = mirror.to_csv_bytes()
+            st.download_button("Download as CSV", history_csv, "input_history.csv", "text/csv")
+    else:
+        st.info("No history found.")
+    unsent = get_submission_queue()[0].depth()
+    if unsent:
+        st.caption(f"{unsent} newer entries are saved locally and waiting for upload; they appear here once uploaded.")
+
+    if st.button("Resync from Google Sheets"):
+        with profiler.stage("full resync from Sheets") as rec:
+            try:
+                rec["rows"] = mirror.rebuild(get_sheet_client())
+            except Exception as e:
+                st.error(f"❌ Resync failed, the local copy is unchanged: {e}")
+            else:
+                st.rerun()
+
+# Upload queue status
+submission_queue, flush_worker = get_submission_queue()
+st.sidebar.metric("Entries waiting for upload", submission_queue.depth())
+if flush_worker.last_flush_ms is not None:
+    st.sidebar.caption(f"Last flush: {flush_worker.last_flush_rows} rows in {flush_worker.last_flush_ms:.0f} ms")
+if flush_worker.last_error_at is not None and flush_worker.last_error_at > (flush_worker.last_flush_at or 0):
+    # The latest attempt failed: broken credentials or sheet, or the network
+    st.sidebar.error(f"Upload failing ({flush_worker.failures} failed attempts so far): {flush_worker.last_error}")
+elif submission_queue.last_error():
+    st.sidebar.warning(f"Upload retrying: {submission_queue.last_error()}")
+
+# Request-level Sheets timings, including this render's calls
+with st.sidebar.expander("Sheets request timings"):
+    timing_summary = get_sheet_client().timing_summary()
+    if timing_summary:
+        st.dataframe(pd.DataFrame(timing_summary).T[["calls", "mean_ms", "max_ms"]].round(1))
+    else:
+        st.caption("No Sheets requests yet.")
+
+show_profiler_panel(profiler)
@@ -0,0 +1,130 @@
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from matplotlib.figure import Figure
+
+from actval_ingest import export_cleaned, ingest_to_parquet, ActValSchema, EXPORT_FORMATS, MAIN_PARAMETERS, ZONE_MARKER
+from control_chart import WindowIndex, draw_control_chart
+
+# Headless version of the Control_CHART_VS7 pipeline for many files at once:
+#   python actval_batch.py runs/ -o review/ --charts
+#   python actval_batch.py "runs/2024-05-*.csv" -o review/ --workers 8 --format csv
+
+
+def find_inputs(patterns):
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths += sorted(glob.glob(os.path.join(pattern, "*.csv")))
+        else:
+            paths += sorted(glob.glob(pattern))
+    # Keep the first occurrence of each file
+    return list(dict.fromkeys(os.path.abspath(p) for p in paths))
+
+
+def output_stem(path):
+    # Name of a file's outputs: its stem plus a short hash of its full path, so inputs that
+    # share a basename in different directories (runs/*/ActVal.csv) never share output files
+    digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]
+    return f"{os.path.splitext(os.path.basename(path))[0]}-{digest}"
+
+
+def chart_parameters(df):
+    zones = {f'Heating Zone {col.split("zone")[-1].strip()}': col for col in df.columns if ZONE_MARKER in col}
+    params = {**MAIN_PARAMETERS, **zones}
+    return {name: col for name, col in params.items()
+            if col in df.columns and pd.api.types.is_numeric_dtype(df[col])}
+
+
+def process_file(path, out_dir, all_columns=False, out_format="parquet", charts=False):
+    start = time.perf_counter()
+    stem = output_stem(path)
+    cleaned_dir = os.path.join(out_dir, "cleaned")
+    os.makedirs(cleaned_dir, exist_ok=True)
+
+    # Clean + cumulative throughput, streamed straight to Parquet
+    parquet_path = os.path.join(cleaned_dir, f"{stem}.parquet")
+    with open(path, "rb") as f:
+        ingest_to_parquet(f, parquet_path, ActValSchema.sniff(f), all_columns=all_columns)
+    df = pd.read_parquet(parquet_path)
+    if out_format != "parquet":
+        label = next(k for k, (extension, _) in EXPORT_FORMATS.items() if extension == out_format)
+        export_cleaned(parquet_path, label)
+        os.remove(parquet_path)
+
+    # Whole-run control chart statistics per parameter
+    stats_rows = []
+    for name, col in chart_parameters(df).items():
+        series = df[col]
+        stats = WindowIndex(series).window_stats(series.index.min(), series.index.max())
+        stats_rows.append({'File': os.path.basename(path), 'Output': stem, 'Parameter': name, 'Column': col, **stats})
+        if charts:
+            chart_dir = os.path.join(out_dir, "charts", stem)
+            os.makedirs(chart_dir, exist_ok=True)
+            fig = Figure(figsize=(12, 6))
+            draw_control_chart(fig.subplots(), series, stats, name, int(fig.get_figwidth() * fig.dpi))
+            fig.autofmt_xdate()
+            fig.savefig(os.path.join(chart_dir, f"{name.replace(' ', '_')}.png"))
+
+    seconds = time.perf_counter() - start
+    size_mb = os.path.getsize(path) / 2**20
+    summary = {
+        'File': os.path.basename(path), 'Path': path, 'Output': stem, 'Rows': len(df), 'Size (MB)': round(size_mb, 2),
+        'Seconds': round(seconds, 3), 'Rows/s': round(len(df) / seconds), 'MB/s': round(size_mb / seconds, 2),
+    }
+    return summary, stats_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clean ActVal CSVs and compute control-chart statistics in parallel.")
+    parser.add_argument("inputs", nargs="+", help="ActVal CSV files, directories or glob patterns")
+    parser.add_argument("-o", "--out", default="actval_batch_output", help="output directory")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--format", choices=[extension for extension, _ in EXPORT_FORMATS.values()], default="parquet", help="cleaned file format")
+    parser.add_argument("--all-columns", action="store_true", help="keep every column, not just the chart columns")
+    parser.add_argument("--charts", action="store_true", help="write a control chart PNG per parameter")
+    args = parser.parse_args(argv)
+
+    paths = find_inputs(args.inputs)
+    if not paths:
+        parser.error("no CSV files matched")
+    os.makedirs(args.out, exist_ok=True)
+    workers = max(1, min(args.workers or 1, len(paths)))
+
+    summaries, stats_rows, failures = [], [], 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(process_file, path, args.out, args.all_columns, args.format, args.charts): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                summary, rows = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"FAILED {os.path.basename(path)}: {e}", file=sys.stderr)
+                continue
+            summaries.append(summary)
+            stats_rows += rows
+            print(f"{summary['Path']}: {summary['Rows']:,} rows in {summary['Seconds']:.2f} s "
+                  f"({summary['Rows/s']:,} rows/s, {summary['MB/s']} MB/s)")
+
+    pd.DataFrame(stats_rows).to_csv(os.path.join(args.out, "stats.csv"), index=False)
+    pd.DataFrame(summaries).to_csv(os.path.join(args.out, "files.csv"), index=False)
+    elapsed = time.perf_counter() - start
+    total_rows = sum(s['Rows'] for s in summaries)
+    print(f"{len(summaries)} file(s), {total_rows:,} rows in {elapsed:.2f} s with {workers} worker(s) "
+          f"({total_rows / elapsed:,.0f} rows/s overall)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from matplotlib.figure import Figure
+
+from actval_ingest import ActValSchema, clean_chunk, ingest_to_parquet, read_chunks, MAIN_PARAMETERS
+from actval_synth import write_synthetic_actval
+from control_chart import WindowIndex, draw_control_chart, render_png
+from rollup import RollupPyramid
+from spc_rules import nelson_counts, RULE_CHUNK_ROWS
+
+# Benchmarks for the control-chart pipeline outside Streamlit, on synthetic ActVal files.
+# Each stage is timed (best of --repeat) and then re-run once under tracemalloc for its
+# peak Python-side allocation (pandas/numpy buffers; Arrow's own pool is not counted).
+# Only the column a stage needs is loaded, and the Nelson stage streams the file, so 10^8-row
+# runs fit in memory. Results are appended as JSON lines; --compare prints the change
+# against an earlier file and needs --repeat >= 3 on both sides to tell noise from change.
+#   python actval_bench.py --rows 1e5 1e6 1e7 -o bench_results.jsonl
+#   python actval_bench.py --rows 1e6 --compare baseline.jsonl
+
+BENCH_DATA_DIR = ".bench_data"
+BENCH_QUERIES = 200
+# The pyarrow engine reads a whole file into memory, so it is skipped above this size
+PYARROW_MAX_ROWS = 20_000_000
+REGRESSION_PCT = 10.0
+MIN_COMPARE_REPEAT = 3
+
+
+def measure(fn, repeat=1, memory=True, self_timed=False):
+    # Best wall time over `repeat` runs, its noise (spread of the runs, % of the best) and
+    # then one tracemalloc run for the peak (MB).
+    # A self_timed fn returns the seconds to count itself (to leave out setup work).
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        elapsed = fn()
+        seconds.append(elapsed if self_timed else time.perf_counter() - start)
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    best = min(seconds)
+    noise_pct = 100 * (max(seconds) - best) / best if len(seconds) > 1 and best else None
+    return best, peak_mb, noise_pct
+
+
+def pandas_window_stats(series, start, end):
+    # The original per-rerun computation, as the baseline for WindowIndex
+    filtered = series.loc[start:end].dropna()
+    mean, std = filtered.mean(), filtered.std()
+    ucl, lcl = mean + 3 * std, mean - 3 * std
+    if lcl < 0:
+        lcl = max(0, filtered[filtered > 0].min())
+    return mean, std, ucl, lcl, int((filtered > ucl).sum()), int((filtered < lcl).sum())
+
+
+def random_windows(index, count, seed=0):
+    rng = np.random.default_rng(seed)
+    positions = np.sort(rng.integers(0, len(index), size=(count, 2)), axis=1)
+    return [(index[a], index[b]) for a, b in positions]
+
+
+def run_environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    import pyarrow
+    return {
+        "commit": commit, "python": platform.python_version(), "pandas": pd.__version__,
+        "numpy": np.__version__, "pyarrow": pyarrow.__version__, "machine": platform.machine(),
+        "cpus": os.cpu_count(), "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def bench_size(rows, data_dir, zones=12, repeat=1, memory=True, queries=BENCH_QUERIES):
+    # Yields one result dict per stage for a synthetic file of `rows` rows
+    csv_path = os.path.join(data_dir, f"actval_{rows}_z{zones}.csv")
+    if not os.path.exists(csv_path):
+        write_synthetic_actval(csv_path, rows, zones)
+    parquet_path = os.path.join(data_dir, f"actval_{rows}_z{zones}.parquet")
+    size_mb = os.path.getsize(csv_path) / 2**20
+
+    def result(stage, seconds, peak_mb, noise_pct, stage_rows=rows, **extra):
+        return {"stage": stage, "rows": rows, "stage_rows": stage_rows, "seconds": seconds, "peak_mb": peak_mb,
+                "noise_pct": noise_pct, "repeat": repeat, "rows_per_s": stage_rows / seconds if seconds else None,
+                **extra}
+
+    with open(csv_path, "rb") as f:
+        schema = ActValSchema.sniff(f)
+
+        def parse():
+            for _ in read_chunks(f, schema, all_columns=False):
+                pass
+
+        seconds, peak, noise = measure(parse, repeat, memory)
+        yield result("parse_csv", seconds, peak, noise, mb_per_s=size_mb / seconds)
+
+        # Cleaning alone: parse time is excluded from the clock
+        def clean():
+            elapsed, carry = 0.0, 0.0
+            for chunk in read_chunks(f, schema, all_columns=False):
+                start = time.perf_counter()
+                _, carry = clean_chunk(chunk, schema.chart_columns, carry, schema.date_format)
+                elapsed += time.perf_counter() - start
+            return elapsed
+
+        seconds, peak, noise = measure(clean, repeat, memory, self_timed=True)
+        yield result("clean", seconds, peak, noise)
+
+        seconds, peak, noise = measure(lambda: ingest_to_parquet(f, parquet_path, schema, all_columns=False), repeat, memory)
+        yield result("ingest_c", seconds, peak, noise, mb_per_s=size_mb / seconds)
+        if rows <= PYARROW_MAX_ROWS:
+            seconds, peak, noise = measure(
+                lambda: ingest_to_parquet(f, parquet_path, schema, all_columns=False, engine='pyarrow'), repeat, memory
+            )
+            yield result("ingest_pyarrow", seconds, peak, noise, mb_per_s=size_mb / seconds)
+
+    # The stats, chart and rollup stages use one column, so only that column (and the index) is read
+    column = MAIN_PARAMETERS['Screw Speed']
+    df = pd.read_parquet(parquet_path, columns=[column])
+    series = df[column]
+    windows = random_windows(df.index, queries)
+
+    # Windowed statistics: index build once per parameter, then per-window queries
+    index = WindowIndex(series)
+    seconds, peak, noise = measure(lambda: WindowIndex(series), repeat, memory)
+    yield result("stats_index_build", seconds, peak, noise)
+    # Random windows cover a third of the file on average
+    seconds, peak, noise = measure(lambda: [index.window_stats(a, b) for a, b in windows], repeat, memory)
+    yield result("stats_query", seconds / queries, peak, noise, stage_rows=len(df) // 3, queries=queries)
+    baseline_queries = windows[:max(queries // 10, 1)]
+    seconds, peak, noise = measure(lambda: [pandas_window_stats(series, a, b) for a, b in baseline_queries], repeat, memory)
+    yield result("stats_query_pandas", seconds / len(baseline_queries), peak, noise, stage_rows=len(df) // 3,
+                 queries=len(baseline_queries))
+
+    # Chart rendering over the full range, as the app draws it
+    stats = index.window_stats(df.index[0], df.index[-1])
+
+    def render(rollup_view=None):
+        fig = Figure(figsize=(12, 6))
+        draw_control_chart(fig.subplots(), series, stats, 'Screw Speed', 1200, rollup_view=rollup_view)
+        fig.autofmt_xdate()
+        return render_png(fig)
+
+    seconds, peak, noise = measure(render, repeat, memory)
+    yield result("chart_downsampled", seconds, peak, noise)
+    seconds, peak, noise = measure(lambda: RollupPyramid.from_frame(df[[column]], columns=[column]), repeat, memory)
+    yield result("rollup_build", seconds, peak, noise)
+    pyramid = RollupPyramid.from_frame(df[[column]], columns=[column])
+    view = pyramid.view(column, df.index[0], df.index[-1], 1200)
+    if view is not None:
+        seconds, peak, noise = measure(lambda: render(view), repeat, memory)
+        yield result("chart_rollup", seconds, peak, noise, level=view.attrs['level'])
+
+    parquet = pq.ParquetFile(parquet_path)
+    chart_columns = [c for c in schema.chart_columns if c in parquet.schema_arrow.names]
+    seconds, peak, noise = measure(lambda: nelson_streamed(parquet, chart_columns), repeat, memory)
+    yield result("nelson_rules", seconds, peak, noise, columns=len(chart_columns))
+
+
+def nelson_streamed(parquet, columns, batch_rows=RULE_CHUNK_ROWS):
+    # Nelson counts over a cleaned Parquet file batch by batch: one pass for each column's
+    # mean and standard deviation (batches merged with Chan's update), one for the rules
+    def blocks():
+        for batch in parquet.iter_batches(batch_size=batch_rows, columns=columns):
+            yield np.column_stack([batch.column(c).to_numpy(zero_copy_only=False) for c in columns]).astype('float64')
+
+    n, mean, m2 = 0, np.zeros(len(columns)), np.zeros(len(columns))
+    for block in blocks():
+        k = len(block)
+        block_mean = block.mean(axis=0)
+        delta = block_mean - mean
+        m2 += ((block - block_mean) ** 2).sum(axis=0) + delta ** 2 * n * k / (n + k)
+        mean += delta * k / (n + k)
+        n += k
+    sigma = np.sqrt(m2 / (n - 1)) if n > 1 else np.full(len(columns), np.nan)
+    return nelson_counts(blocks(), mean, sigma)
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(baseline, current, threshold=REGRESSION_PCT):
+    # Latest result per (stage, rows) in each file; positive change = slower. A stage only
+    # counts as a regression when it is slower by more than the threshold and by more than
+    # the run-to-run noise measured on both sides.
+    def latest(results):
+        frame = pd.DataFrame(results).drop_duplicates(["stage", "rows"], keep="last").set_index(["stage", "rows"])
+        if "noise_pct" not in frame:
+            frame["noise_pct"] = np.nan
+        return frame
+
+    base, new = latest(baseline), latest(current)
+    table = pd.DataFrame({"baseline_s": base["seconds"], "current_s": new["seconds"]}).dropna()
+    table["change_%"] = (100 * (table["current_s"] / table["baseline_s"] - 1)).round(1)
+    noise = base["noise_pct"].reindex(table.index).fillna(0) + new["noise_pct"].reindex(table.index).fillna(0)
+    table["limit_%"] = np.maximum(threshold, noise).round(1)
+    table["regression"] = table["change_%"] > table["limit_%"]
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ActVal control-chart pipeline.")
+    parser.add_argument("--rows", type=float, nargs="+", default=[1e5, 1e6], help="file sizes, 1e5 to 1e8")
+    parser.add_argument("--zones", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (best is kept)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run of each stage")
+    parser.add_argument("--data-dir", default=BENCH_DATA_DIR, help="where synthetic files are kept and reused")
+    parser.add_argument("-o", "--out", default="bench_results.jsonl", help="JSON-lines results file (appended)")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+    if args.compare and args.repeat < MIN_COMPARE_REPEAT:
+        parser.error(f"--compare needs --repeat {MIN_COMPARE_REPEAT} or more to separate noise from change")
+
+    environment = run_environment()
+    current = []
+    with open(args.out, "a", encoding="utf-8") as out:
+        for rows in (int(r) for r in args.rows):
+            for record in bench_size(rows, args.data_dir, args.zones, args.repeat, not args.no_memory):
+                record.update(environment)
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                current.append(record)
+                peak = f"{record['peak_mb']:.1f} MB" if record["peak_mb"] is not None else "-"
+                print(f"{rows:>12,} {record['stage']:<20} {record['seconds'] * 1000:>12.2f} ms  peak {peak}")
+
+    if args.compare:
+        table = compare(load_results(args.compare), current)
+        print(table.to_string())
+        if table["regression"].any():
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,395 @@
+import csv
+import gzip
+import hashlib
+import os
+import re
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+THROUGHPUT_COL = 'Dosing station 1: Total throughput'
+CUMULATIVE_COL = 'Cumulative Throughput'
+
+# Columns the control charts use: the main parameters plus every heating zone
+MAIN_PARAMETERS = {
+    'Screw Speed': 'Extruder 1: Screw rotation speed',
+    'Torque': 'Extruder 1: Screw torque',
+    'Pressure': 'Extruder 1: Melt pressure 1',
+    'Throughput': THROUGHPUT_COL
+}
+ZONE_MARKER = 'Extruder 1: temperature zone'
+
+# Date layouts tried against a sample of the file. One is only used when it is the single
+# layout that reads the whole sample (01/12 could be either day or month first); otherwise
+# dates are inferred as before.
+DATE_FORMATS = [
+    '%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M:%S.%f', '%d.%m.%Y %H:%M',
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S',
+    '%d/%m/%Y %H:%M:%S', '%m/%d/%Y %H:%M:%S', '%d/%m/%Y %H:%M',
+]
+DATE_SAMPLE_ROWS = 200
+
+# Cleaned files are cached as Parquet, keyed by the upload's content hash.
+# Bump CLEAN_VERSION whenever the cleaning rules change so old caches are ignored.
+CACHE_DIR = os.environ.get("ACTVAL_CACHE_DIR", ".actval_cache")
+CLEAN_VERSION = 3
+# The cache (cleaned files and their exports) is trimmed to this size, least recently used first;
+# files from an older CLEAN_VERSION are removed whenever it is trimmed
+CACHE_MAX_BYTES = int(os.environ.get("ACTVAL_CACHE_MAX_BYTES", 20 * 2**30))
+CHUNK_ROWS = 200_000
+HASH_BLOCK = 1 << 20
+
+# Download formats for the cleaned frame: label -> (file extension, MIME type).
+# Exports are written next to the Parquet cache and encoded EXPORT_BATCH_ROWS rows at a time.
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'CSV (gzip)': ('csv.gz', 'application/gzip'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Feather': ('feather', 'application/vnd.apache.arrow.file'),
+}
+EXPORT_BATCH_ROWS = 100_000
+# Streamlit holds every download in server memory for as long as the session shows it, so bounded
+# encoding does not bound serving; exports above this size are left on disk instead of offered
+EXPORT_SERVE_MAX_BYTES = int(os.environ.get("ACTVAL_EXPORT_SERVE_MAX_BYTES", 512 * 2**20))
+
+
+def content_hash(fileobj):
+    # Stream the file through sha256 so multi-GB uploads are never copied
+    h = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(HASH_BLOCK), b''):
+        h.update(block)
+    fileobj.seek(0)
+    return h.hexdigest()
+
+
+def cache_path(key, all_columns=True, engine='c'):
+    # The engines differ on some malformed lines (pyarrow drops short rows), so each gets its own file
+    return os.path.join(CACHE_DIR, f"{key}_v{CLEAN_VERSION}_{'all' if all_columns else 'chart'}_{engine}.parquet")
+
+
+class ActValSchema:
+    # What a given ActVal file looks like: its header, the chart columns it contains and
+    # its date layout. Sniffed from the first lines so the full parse can use usecols,
+    # explicit float64 dtypes and a fixed date format.
+
+    def __init__(self, header, date_format=None):
+        if 'Date' not in header:
+            raise ValueError("'Date' column not found. Cannot continue.")
+        self.header = list(header)
+        self.date_format = date_format
+        wanted = set(MAIN_PARAMETERS.values())
+        self.chart_columns = [c for c in self.header if c in wanted or ZONE_MARKER in c]
+
+    @classmethod
+    def sniff(cls, fileobj):
+        fileobj.seek(0)
+        header = next(csv.reader([fileobj.readline().decode('ascii', errors='replace')]))
+        fileobj.seek(0)
+        sample = pd.read_csv(fileobj, encoding='ascii', sep=',', on_bad_lines='skip',
+                             usecols=['Date'], nrows=DATE_SAMPLE_ROWS)['Date'].dropna().astype(str)
+        fileobj.seek(0)
+        matches = [fmt for fmt in DATE_FORMATS
+                   if len(sample) and pd.to_datetime(sample, format=fmt, errors='coerce').notna().all()]
+        return cls(header, matches[0] if len(matches) == 1 else None)
+
+    def usecols(self, all_columns):
+        return None if all_columns else ['Date'] + self.chart_columns
+
+    def dtypes(self):
+        return {col: 'float64' for col in self.chart_columns}
+
+
+def parse_dates(values, date_format=None):
+    # Sniffed layout first; anything it cannot read is re-parsed with inference, as the
+    # sample may not have shown every layout in the file
+    parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+    if date_format is not None:
+        retry = parsed.isna() & values.notna()
+        if retry.any():
+            with warnings.catch_warnings():
+                # Unreadable dates are expected here; pandas warns when it falls back to dateutil
+                warnings.simplefilter('ignore', UserWarning)
+                parsed[retry] = pd.to_datetime(values[retry], errors='coerce')
+    return parsed
+
+
+def clean_chunk(chunk, numeric_cols, carry, date_format=None):
+    # Parse dates and drop rows without a valid timestamp
+    chunk['Date'] = parse_dates(chunk['Date'], date_format)
+    chunk = chunk[chunk['Date'].notna()].set_index('Date')
+
+    # Numeric columns: coerce (the column set is fixed by the first chunk so every
+    # chunk shares one Parquet schema), clip negatives to 0, fill with 0
+    for col in numeric_cols:
+        if not pd.api.types.is_numeric_dtype(chunk[col]):
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+    chunk[numeric_cols] = chunk[numeric_cols].astype('float64').clip(lower=0).fillna(0)
+
+    # Text columns: fill with '' and store as plain strings
+    text_cols = chunk.columns.difference(numeric_cols, sort=False)
+    for col in text_cols:
+        chunk[col] = chunk[col].fillna('').astype(str)
+
+    # Cumulative throughput continues from the previous chunk's last value
+    if THROUGHPUT_COL in chunk.columns:
+        cumulative = chunk[THROUGHPUT_COL].cumsum() + carry
+        chunk[CUMULATIVE_COL] = cumulative
+        if len(cumulative):
+            carry = float(cumulative.iloc[-1])
+    return chunk, carry
+
+
+def read_chunks(fileobj, schema, all_columns=True, engine='c', explicit_dtypes=True, chunk_rows=CHUNK_ROWS):
+    # The C engine streams the file in chunks; the pyarrow engine is multithreaded but reads
+    # it in one piece (and drops short rows as bad lines), so it suits files that fit in memory
+    fileobj.seek(0)
+    usecols = schema.usecols(all_columns)
+    options = dict(encoding='ascii', sep=',', on_bad_lines='skip', dtype=schema.dtypes() if explicit_dtypes else None)
+    if engine == 'pyarrow':
+        return [pd.read_csv(fileobj, engine='pyarrow', usecols=usecols, **options)]
+    # Given usecols, the C parser keeps rows with too many fields instead of skipping them as
+    # bad lines, so every column is parsed and the unused ones are dropped chunk by chunk
+    reader = pd.read_csv(fileobj, chunksize=chunk_rows, **options)
+    if usecols is None:
+        return reader
+    return (chunk[usecols] for chunk in reader)
+
+
+def ingest_to_parquet(fileobj, out_path, schema=None, all_columns=True, engine='c',
+                      explicit_dtypes=True, chunk_rows=CHUNK_ROWS):
+    # Explicit float64 dtypes are fastest, but a chart column holding text somewhere makes the
+    # parser raise; the file is then parsed again without them and coerced in clean_chunk
+    schema = schema or ActValSchema.sniff(fileobj)
+    if explicit_dtypes:
+        try:
+            return _write_cleaned(fileobj, out_path, schema, all_columns, engine, True, chunk_rows)
+        except (ValueError, TypeError):
+            pass
+    return _write_cleaned(fileobj, out_path, schema, all_columns, engine, False, chunk_rows)
+
+
+def _write_cleaned(fileobj, out_path, schema, all_columns, engine, explicit_dtypes, chunk_rows):
+    reader = read_chunks(fileobj, schema, all_columns, engine, explicit_dtypes, chunk_rows)
+    tmp_path = out_path + ".tmp"
+    writer = None
+    table_schema = None
+    numeric_cols = None
+    carry = 0.0
+    try:
+        for chunk in reader:
+            if numeric_cols is None:
+                # Chart columns are always numeric; anything else keeps the type of the first chunk
+                numeric_cols = list(chunk.select_dtypes(include=[np.number]).columns)
+                numeric_cols += [c for c in schema.chart_columns if c in chunk.columns and c not in numeric_cols]
+            chunk, carry = clean_chunk(chunk, numeric_cols, carry, schema.date_format)
+            table = pa.Table.from_pandas(chunk, schema=table_schema, preserve_index=True)
+            if writer is None:
+                table_schema = table.schema
+                os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+                writer = pq.ParquetWriter(tmp_path, table_schema)
+            writer.write_table(table)
+    except Exception:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if writer is None:
+        raise ValueError("File contains no rows.")
+    writer.close()
+    os.replace(tmp_path, out_path)
+
+
+def prune_cache(max_bytes=CACHE_MAX_BYTES, keep=(), cache_dir=CACHE_DIR):
+    # Remove stale-version files, then the least recently used ones until the cache fits in
+    # max_bytes. Cache hits refresh a file's mtime, so mtime order is use order. Paths in
+    # `keep` (the file just written or about to be served) are never removed.
+    if not os.path.isdir(cache_dir):
+        return 0
+    keep = {os.path.abspath(p) for p in keep}
+    entries, removed = [], 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith('.tmp') or os.path.abspath(path) in keep or not os.path.isfile(path):
+            continue
+        version = re.search(r'_v(\d+)_', name)
+        try:
+            if version is not None and int(version.group(1)) != CLEAN_VERSION:
+                os.remove(path)
+                removed += 1
+                continue
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # Removed by another session meanwhile
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries) + sum(os.path.getsize(p) for p in keep if os.path.exists(p))
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return removed
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def ensure_cleaned(fileobj, key=None, all_columns=True, engine='c'):
+    # Path of the cleaned Parquet cache for this file, parsing it first if it is not there yet
+    key = key or content_hash(fileobj)
+    path = cache_path(key, all_columns, engine)
+    if os.path.exists(path):
+        _touch(path)
+        return path
+    ingest_to_parquet(fileobj, path, ActValSchema.sniff(fileobj), all_columns, engine)
+    prune_cache(keep=[path])
+    return path
+
+
+def load_cleaned(fileobj, key=None, all_columns=True, engine='c'):
+    # Only the first load of a given file pays the parse cost; later loads read the Parquet cache.
+    # With all_columns=False only Date and the chart columns are parsed.
+    return pd.read_parquet(ensure_cleaned(fileobj, key, all_columns, engine))
+
+
+def compact_frame(df):
+    # Compact in-memory copy: sensor columns as float32, text columns as categoricals and a
+    # datetime64[ns] index (int64 nanoseconds underneath). The running cumulative throughput
+    # stays float64, which float32 could not hold to the unit over long runs.
+    # Statistics convert back to float64 before summing, so only storage precision changes.
+    compact = {}
+    for col in df.columns:
+        series = df[col]
+        if col == CUMULATIVE_COL:
+            compact[col] = series
+        elif pd.api.types.is_float_dtype(series):
+            compact[col] = series.astype('float32')
+        elif pd.api.types.is_integer_dtype(series):
+            compact[col] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_bool_dtype(series):
+            compact[col] = series
+        else:
+            compact[col] = series.astype('category')
+    out = pd.DataFrame(compact, index=df.index)
+    if isinstance(out.index, pd.DatetimeIndex):
+        out.index = out.index.as_unit('ns')
+    return out
+
+
+def memory_report(before, after):
+    # Per-column dtype and memory (MB, including string contents) of two versions of a frame
+    def usage(df):
+        return df.memory_usage(deep=True, index=True) / 2**20
+
+    old, new = usage(before), usage(after)
+    old_dtypes = {'Index': before.index.dtype, **before.dtypes.to_dict()}
+    new_dtypes = {'Index': after.index.dtype, **after.dtypes.to_dict()}
+    report = pd.DataFrame({
+        'Dtype before': [str(old_dtypes[c]) for c in old.index],
+        'MB before': old.to_numpy(),
+        'Dtype after': [str(new_dtypes.get(c, '')) for c in old.index],
+        'MB after': new.reindex(old.index).to_numpy(),
+    }, index=old.index)
+    report.loc['Total'] = ['', report['MB before'].sum(), '', report['MB after'].sum()]
+    report['Saved %'] = (100 * (1 - report['MB after'] / report['MB before'])).round(1)
+    report.index.name = 'Column'
+    return report
+
+
+def export_cleaned(parquet_path, fmt, batch_rows=EXPORT_BATCH_ROWS):
+    # Path of the cleaned data in one of EXPORT_FORMATS, written once per cache file.
+    # Encoding goes one Parquet batch at a time, so memory stays bounded by batch_rows.
+    extension, _ = EXPORT_FORMATS[fmt]
+    if extension == 'parquet':
+        return parquet_path
+    out_path = parquet_path[:-len('.parquet')] + '.' + extension
+    if os.path.exists(out_path):
+        _touch(out_path)
+        return out_path
+    source = pq.ParquetFile(parquet_path)
+    tmp_path = out_path + ".tmp"
+    try:
+        if extension == 'feather':
+            # Feather v2 is the Arrow IPC file format; LZ4 is what pandas.to_feather uses by default
+            options = pa.ipc.IpcWriteOptions(compression='lz4')
+            with pa.ipc.new_file(tmp_path, source.schema_arrow, options=options) as writer:
+                for batch in source.iter_batches(batch_size=batch_rows):
+                    writer.write_batch(batch)
+        else:
+            opener = gzip.open if extension == 'csv.gz' else open
+            with opener(tmp_path, 'wt', encoding='utf-8', newline='') as out:
+                header = True
+                for batch in source.iter_batches(batch_size=batch_rows):
+                    batch.to_pandas().reset_index().to_csv(out, index=False, header=header, lineterminator='\n')
+                    header = False
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, out_path)
+    if os.path.abspath(os.path.dirname(out_path)) == os.path.abspath(CACHE_DIR):
+        prune_cache(keep=[parquet_path, out_path])
+    return out_path
+
+
+def _measure(fn):
+    # Timed without tracemalloc (it slows allocation-heavy code), then re-run for the peak
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    del result
+    # The stage profiler may already be tracing; leave its session running if so
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = fn()
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        if started:
+            tracemalloc.stop()
+    return result, seconds, peak
+
+
+def profile_parse(fileobj, all_columns=False, engine='c'):
+    # Parse time and peak Python-tracked memory (pandas/numpy buffers; Arrow's own pool is
+    # not included) of the original whole-file parse against the schema-aware parse
+    def legacy():
+        fileobj.seek(0)
+        df = pd.read_csv(fileobj, encoding='ascii', sep=',', on_bad_lines='skip')
+        df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+        return df
+
+    def schema_aware():
+        schema = ActValSchema.sniff(fileobj)
+        frames = []
+        for chunk in read_chunks(fileobj, schema, all_columns, engine):
+            chunk['Date'] = parse_dates(chunk['Date'], schema.date_format)
+            frames.append(chunk)
+        return pd.concat(frames)
+
+    rows = []
+    for name, fn in [('Original (all columns, inferred dates)', legacy),
+                     (f"Schema-aware ({'all' if all_columns else 'chart'} columns, {engine} engine)", schema_aware)]:
+        df, seconds, peak = _measure(fn)
+        rows.append({'Parser': name, 'Seconds': round(seconds, 3), 'Peak memory (MB)': round(peak / 2**20, 1),
+                     'Rows': len(df), 'Columns': df.shape[1]})
+    fileobj.seek(0)
+    return pd.DataFrame(rows)
@@ -0,0 +1,120 @@
+import argparse
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+from actval_ingest import MAIN_PARAMETERS, THROUGHPUT_COL, ZONE_MARKER
+
+# Synthetic ActVal exports for benchmarks and offline testing, shaped like the real files:
+# a Date column, the Extruder 1 screw/torque/pressure channels, N temperature zones, the
+# dosing throughput and a status text column, one row per second. Sensors drift around
+# their setpoints with occasional spikes; a small share of cells are negative or blank,
+# and a few lines are malformed (extra fields or an unreadable date).
+#   python actval_synth.py 1000000 -o runs/synthetic_1M.csv --zones 12
+
+SYNTH_CHUNK_ROWS = 250_000
+DATE_FORMAT = '%d.%m.%Y %H:%M:%S'
+STATUS_COL = 'Extruder 1: Operating status'
+SETPOINTS = {
+    MAIN_PARAMETERS['Screw Speed']: (300.0, 4.0),
+    MAIN_PARAMETERS['Torque']: (62.0, 2.5),
+    MAIN_PARAMETERS['Pressure']: (85.0, 3.0),
+    THROUGHPUT_COL: (25.0, 0.8),
+}
+ZONE_BASE_TEMP = 180.0
+NEGATIVE_SHARE = 0.001
+BLANK_SHARE = 0.001
+SPIKE_SHARE = 0.0005
+BAD_LINE_SHARE = 0.0002
+
+
+def synthetic_columns(zones=12):
+    return (['Date'] + list(SETPOINTS)[:3]
+            + [f'{ZONE_MARKER} {z}' for z in range(1, zones + 1)]
+            + [THROUGHPUT_COL, STATUS_COL])
+
+
+def synthetic_chunk(rng, start, rows, zones=12, state=None):
+    # One chunk of clean-looking readings starting at `start`; `state` carries each
+    # channel's drift across chunks so consecutive chunks join up
+    state = {} if state is None else state
+    frame = {'Date': pd.date_range(start, periods=rows, freq='s')}
+    channels = dict(SETPOINTS)
+    for z in range(1, zones + 1):
+        channels[f'{ZONE_MARKER} {z}'] = (ZONE_BASE_TEMP + 5.0 * z, 1.5)
+    for col, (setpoint, sigma) in channels.items():
+        # Slow bounded random-walk drift plus white noise and rare spikes
+        steps = rng.normal(0, sigma * 0.01, rows)
+        drift = np.clip(state.get(col, 0.0) + np.cumsum(steps), -2 * sigma, 2 * sigma)
+        state[col] = float(drift[-1])
+        values = setpoint + drift + rng.normal(0, sigma, rows)
+        spikes = rng.random(rows) < SPIKE_SHARE
+        values[spikes] += rng.choice([-1, 1], spikes.sum()) * sigma * rng.uniform(4, 8, spikes.sum())
+        values[rng.random(rows) < NEGATIVE_SHARE] *= -1
+        values[rng.random(rows) < BLANK_SHARE] = np.nan
+        frame[col] = values.round(2)
+    frame[STATUS_COL] = np.where(rng.random(rows) < 0.01, 'Stopped', 'Running')
+    return pd.DataFrame(frame)[synthetic_columns(zones)], state
+
+
+def chunk_to_csv(chunk):
+    # CSV bytes without a header; Arrow's writer is several times faster than DataFrame.to_csv
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    dates = pc.strftime(table['Date'].cast(pa.timestamp('s')), format=DATE_FORMAT)
+    table = table.set_column(0, 'Date', dates)
+    out = io.BytesIO()
+    pa_csv.write_csv(table, out, pa_csv.WriteOptions(include_header=False, quoting_style='none'))
+    return out.getvalue()
+
+
+def _with_bad_lines(rng, csv_bytes):
+    # Replace a few lines with ones the parser has to skip or drop
+    lines = csv_bytes.split(b'\n')
+    n_bad = rng.binomial(len(lines) - 1, BAD_LINE_SHARE)
+    for i in rng.choice(len(lines) - 1, n_bad, replace=False):
+        if rng.random() < 0.5:
+            lines[i] = lines[i] + b',1,2,3'  # too many fields
+        else:
+            lines[i] = b'##.##.#### ##:##:##' + lines[i][lines[i].index(b','):]  # unreadable date
+    return b'\n'.join(lines)
+
+
+def write_synthetic_actval(path, rows, zones=12, seed=0, start='2024-01-01 06:00:00', chunk_rows=SYNTH_CHUNK_ROWS):
+    # Stream `rows` rows to path chunk by chunk, so 10^8-row files never sit in memory.
+    # The same arguments always produce the same file.
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    state = {}
+    timestamp = pd.Timestamp(start)
+    with open(tmp_path, 'wb') as out:
+        out.write((','.join(synthetic_columns(zones)) + '\n').encode('ascii'))
+        for offset in range(0, rows, chunk_rows):
+            n = min(chunk_rows, rows - offset)
+            chunk, state = synthetic_chunk(rng, timestamp, n, zones, state)
+            out.write(_with_bad_lines(rng, chunk_to_csv(chunk)))
+            timestamp += pd.Timedelta(seconds=n)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic ActVal CSV.")
+    parser.add_argument("rows", type=float, help="number of rows, e.g. 1e6")
+    parser.add_argument("-o", "--out", default=None, help="output path (default synthetic_<rows>.csv)")
+    parser.add_argument("--zones", type=int, default=12, help="temperature zones")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    rows = int(args.rows)
+    path = args.out or f"synthetic_{rows}.csv"
+    write_synthetic_actval(path, rows, args.zones, args.seed)
+    print(f"Wrote {rows:,} rows to {path} ({os.path.getsize(path) / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import io
+import threading
+from collections import OrderedDict
+
+import matplotlib.dates as mdates
+import numpy as np
+import pandas as pd
+
+STATS_BLOCK = 2048
+CHART_CACHE_BYTES = 64 * 2**20
+
+
+class WindowIndex:
+    # Per-parameter index for O(1)/O(log n) control-chart statistics over any time window.
+    # Prefix sums of x and x² give mean and std; a block-sorted rank structure gives the
+    # number of points above/below any threshold with one vectorized binary search per block.
+
+    def __init__(self, series, block_size=STATS_BLOCK):
+        values = pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64')
+        times = series.index.values.astype('datetime64[ns]')
+        keep = ~np.isnan(values)
+        values, times = values[keep], times[keep]
+        if len(times) and not (times[1:] >= times[:-1]).all():
+            order = np.argsort(times, kind='stable')
+            values, times = values[order], times[order]
+
+        n = len(values)
+        self.values = values
+        self.times = times
+        self.block = block_size
+
+        # Shift by the first value so the x² sums don't lose precision on large offsets
+        self.shift = values[0] if n else 0.0
+        centered = values - self.shift
+        self.cs1 = np.concatenate(([0.0], np.cumsum(centered)))
+        self.cs2 = np.concatenate(([0.0], np.cumsum(centered * centered)))
+
+        # Global ranks; block b's ranks are stored sorted in keys[b*B:(b+1)*B] as b*n + rank
+        order = np.argsort(values, kind='stable')
+        self.sorted_values = values[order]
+        ranks = np.empty(n, dtype='int64')
+        ranks[order] = np.arange(n)
+        block_ids = np.arange(n, dtype='int64') // block_size
+        self.keys = np.sort(block_ids * n + ranks)
+
+        # Smallest positive value per block, used for the LCL floor
+        n_blocks = -(-n // block_size)
+        positive = np.where(values > 0, values, np.inf)
+        padded = np.full(n_blocks * block_size, np.inf)
+        padded[:n] = positive
+        self.block_min_positive = padded.reshape(n_blocks, block_size).min(axis=1) if n else np.empty(0)
+
+    def __len__(self):
+        return len(self.values)
+
+    def locate(self, start, end):
+        # Same bounds as df.loc[start:end] (both ends inclusive)
+        i = np.searchsorted(self.times, np.datetime64(pd.Timestamp(start), 'ns'), side='left')
+        j = np.searchsorted(self.times, np.datetime64(pd.Timestamp(end), 'ns'), side='right')
+        return int(i), int(max(i, j))
+
+    def _split(self, i, j):
+        # Full blocks [bl, br) plus the loose edges around them
+        bl = -(-i // self.block)
+        br = j // self.block
+        if bl >= br:
+            return bl, bl, [(i, j)]
+        return bl, br, [(i, bl * self.block), (br * self.block, j)]
+
+    def count_above(self, i, j, threshold):
+        if i >= j or np.isnan(threshold):
+            return 0
+        bl, br, edges = self._split(i, j)
+        total = sum(int((self.values[a:b] > threshold).sum()) for a, b in edges)
+        if br > bl:
+            n = len(self.values)
+            r = np.searchsorted(self.sorted_values, threshold, side='right')
+            blocks = np.arange(bl, br, dtype='int64')
+            ends = np.minimum((blocks + 1) * self.block, n)
+            total += int((ends - np.searchsorted(self.keys, blocks * n + r)).sum())
+        return total
+
+    def count_below(self, i, j, threshold):
+        if i >= j or np.isnan(threshold):
+            return 0
+        bl, br, edges = self._split(i, j)
+        total = sum(int((self.values[a:b] < threshold).sum()) for a, b in edges)
+        if br > bl:
+            n = len(self.values)
+            r = np.searchsorted(self.sorted_values, threshold, side='left')
+            blocks = np.arange(bl, br, dtype='int64')
+            total += int((np.searchsorted(self.keys, blocks * n + r) - blocks * self.block).sum())
+        return total
+
+    def min_positive(self, i, j):
+        bl, br, edges = self._split(i, j)
+        best = np.inf
+        for a, b in edges:
+            part = self.values[a:b]
+            part = part[part > 0]
+            if part.size:
+                best = min(best, part.min())
+        if br > bl:
+            best = min(best, self.block_min_positive[bl:br].min())
+        return best if np.isfinite(best) else None
+
+    def window_stats(self, start, end):
+        i, j = self.locate(start, end)
+        n = j - i
+        s1 = self.cs1[j] - self.cs1[i]
+        s2 = self.cs2[j] - self.cs2[i]
+        mean = self.shift + s1 / n if n else np.nan
+        std = np.sqrt(max(s2 - s1 * s1 / n, 0.0) / (n - 1)) if n > 1 else np.nan
+        ucl = mean + 3 * std
+        lcl = mean - 3 * std
+        if lcl < 0:
+            lcl = max(0, self.min_positive(i, j) or 0)
+
+        points_above_ucl = self.count_above(i, j, ucl)
+        points_below_lcl = self.count_below(i, j, lcl)
+        pct_out = (points_above_ucl + points_below_lcl) / n * 100 if n else 0
+        return {
+            'mean': mean, 'std': std, 'ucl': ucl, 'lcl': lcl,
+            'above': points_above_ucl, 'below': points_below_lcl,
+            'total': n, 'pct_out': pct_out,
+        }
+
+
+def minmax_indices(values, n_buckets):
+    # Positions of the first, last, min and max sample in each of n_buckets equal-count
+    # buckets, so every spike survives at the plot's pixel resolution and the line enters
+    # and leaves each bucket where the full series does
+    n = len(values)
+    if n <= 4 * n_buckets:
+        return np.arange(n)
+    size = -(-n // n_buckets)
+    n_buckets = -(-n // size)
+    padded = np.empty(n_buckets * size, dtype=values.dtype)
+    padded[:n] = values
+    padded[n:] = values[-1]
+    buckets = padded.reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    lows = np.minimum(offsets + buckets.argmin(axis=1), n - 1)
+    highs = np.minimum(offsets + buckets.argmax(axis=1), n - 1)
+    lasts = np.minimum(offsets + size - 1, n - 1)
+    return np.unique(np.concatenate((offsets, lasts, lows, highs)))
+
+
+def downsample_for_plot(series, ucl, lcl, width_px):
+    # First/last/min/max bucketing sized to the figure width; out-of-control points are always kept
+    values = series.to_numpy()
+    keep = minmax_indices(values, max(int(width_px), 1))
+    outside = np.flatnonzero((values > ucl) | (values < lcl))
+    if outside.size:
+        keep = np.union1d(keep, outside)
+    return series.iloc[keep]
+
+
+def draw_control_chart(ax, series, stats, label, width_px=1200, exact=False, rollup_view=None):
+    # Control chart onto ax: a rollup min/max envelope if given, else the series itself
+    # (min/max downsampled to width_px unless exact). Returns what was plotted.
+    mean, ucl, lcl = stats['mean'], stats['ucl'], stats['lcl']
+    if rollup_view is not None:
+        ax.fill_between(rollup_view.index, rollup_view['min'], rollup_view['max'], alpha=0.25,
+                        label=f"{label} min–max ({rollup_view.attrs['level']})")
+        ax.plot(rollup_view.index, rollup_view['mean'], label=label, alpha=0.5)
+        plotted = rollup_view
+    else:
+        # Min/max per pixel column; spikes and every out-of-control point are kept
+        plotted = series if exact else downsample_for_plot(series, ucl, lcl, width_px)
+        ax.plot(plotted.index, plotted, label=label, alpha=0.5)
+    ax.axhline(mean, color='black', linestyle='-', label=f'Mean = {mean:.2f}')
+    ax.axhline(ucl, color='red', linestyle='--', label=f'UCL = {ucl:.2f}')
+    ax.axhline(lcl, color='red', linestyle='--', label=f'LCL = {lcl:.2f}')
+    ax.plot(series[series > ucl].index, series[series > ucl], 'ro', label='Above UCL')
+    ax.plot(series[series < lcl].index, series[series < lcl], 'go', label='Below LCL')
+    ax.set_title(f'Control Chart for {label}')
+    ax.set_xlabel('Time')
+    ax.set_ylabel(label)
+    ax.legend(loc='best')
+
+    # Format datetime axis
+    locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    return plotted
+
+
+def stats_table(stats):
+    return pd.DataFrame({
+        'Statistic': ['Mean', 'Std Dev', 'UCL', 'LCL', 'Points Above UCL',
+                      'Points Below LCL', 'Total Points', 'Out of Control %'],
+        'Value': [f"{stats['mean']:.2f}", f"{stats['std']:.2f}", f"{stats['ucl']:.2f}", f"{stats['lcl']:.2f}",
+                  stats['above'], stats['below'], stats['total'], f"{stats['pct_out']:.2f}%"]
+    })
+
+
+def render_png(fig, dpi=200):
+    # Rasterize once, with st.pyplot's own defaults (tight bbox, 200 dpi)
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight', dpi=dpi)
+    return buf.getvalue()
+
+
+class ChartCache:
+    # Size-bounded LRU of rendered charts. `render()` returns (value, size_bytes) and only
+    # runs on a miss; the least recently used entries are dropped once max_bytes is exceeded.
+
+    def __init__(self, max_bytes=CHART_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self.bytes -= dropped
+
+    def get_or_render(self, key, render):
+        value = self.get(key)
+        if value is None:
+            value, size = render()
+            self.put(key, value, size)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def info(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries), 'bytes': self.bytes, 'max_bytes': self.max_bytes,
+            'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,112 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+ZONE_COLUMNS = [f"Zone_{i+1}" for i in range(10)]
+COLUMNS = ["Timestamp"] + ZONE_COLUMNS + ["Screw_Speed"]
+CSV_IMPORT_ROWS = 50_000
+
+
+class ExtruderStore:
+    # Append-only SQLite store for saved extruder settings. WAL mode lets concurrent
+    # Streamlit sessions append and read without rewriting or clobbering each other.
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS readings ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "Timestamp TEXT NOT NULL, "
+                + ", ".join(f"{col} REAL" for col in COLUMNS[1:]) + ")"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS readings_timestamp ON readings (Timestamp)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def append(self, row):
+        # row follows COLUMNS order, Timestamp formatted as "%Y-%m-%d %H:%M:%S"
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"INSERT INTO readings ({', '.join(COLUMNS)}) VALUES ({placeholders})", row)
+
+    def count(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+
+    def bounds(self):
+        with closing(self._connect()) as conn:
+            first, last = conn.execute("SELECT MIN(Timestamp), MAX(Timestamp) FROM readings").fetchone()
+        return (pd.Timestamp(first), pd.Timestamp(last)) if first else (None, None)
+
+    def read_range(self, start=None, end=None):
+        # Rows with start <= Timestamp <= end, served by the Timestamp index
+        query = f"SELECT {', '.join(COLUMNS)} FROM readings WHERE 1=1"
+        params = []
+        if start is not None:
+            query += " AND Timestamp >= ?"
+            params.append(pd.Timestamp(start).strftime("%Y-%m-%d %H:%M:%S"))
+        if end is not None:
+            query += " AND Timestamp <= ?"
+            params.append(pd.Timestamp(end).strftime("%Y-%m-%d %H:%M:%S"))
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(query + " ORDER BY Timestamp, id", conn, params=params)
+        df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+        return df
+
+    def read_after(self, last_id):
+        # Rows appended after row id `last_id`, plus the new last id
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(
+                f"SELECT id, {', '.join(COLUMNS)} FROM readings WHERE id > ? ORDER BY id", conn, params=[last_id]
+            )
+        new_last_id = int(df["id"].iloc[-1]) if len(df) else last_id
+        df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+        return df.drop(columns="id"), new_last_id
+
+    def migrate_csv(self, csv_path):
+        # One-time import of a legacy extruder_data.csv; the CSV is renamed once its rows are in.
+        # If the store already has rows, CSV rows identical to one of them are skipped, so a
+        # CSV that was partly saved to both (or a second session racing this one) adds nothing twice.
+        if not os.path.exists(csv_path):
+            return 0
+        imported = 0
+        columns = ", ".join(COLUMNS)
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not os.path.exists(csv_path):
+                    # Another session finished the migration first
+                    conn.rollback()
+                    return 0
+                existing_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM readings").fetchone()[0]
+                if existing_id:
+                    matches = " AND ".join(f"{col} IS ?" for col in COLUMNS)
+                    insert = (f"INSERT INTO readings ({columns}) SELECT {placeholders} WHERE NOT EXISTS "
+                              f"(SELECT 1 FROM readings WHERE id <= {existing_id} AND {matches})")
+                else:
+                    insert = f"INSERT INTO readings ({columns}) VALUES ({placeholders})"
+                for chunk in pd.read_csv(csv_path, chunksize=CSV_IMPORT_ROWS):
+                    chunk = chunk.reindex(columns=COLUMNS)
+                    chunk["Timestamp"] = pd.to_datetime(chunk["Timestamp"]).dt.strftime("%Y-%m-%d %H:%M:%S")
+                    rows = chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+                    if existing_id:
+                        rows = (row + row for row in rows)
+                    before = conn.total_changes
+                    conn.executemany(insert, rows)
+                    imported += conn.total_changes - before
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        try:
+            os.replace(csv_path, csv_path + ".migrated")
+        except FileNotFoundError:
+            # Another session finished the migration first
+            pass
+        return imported
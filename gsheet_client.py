@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import deque
+
+SHEET_NAME = "ExtruderLog"
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+EXPECTED_HEADERS = (
+    ["Timestamp", "Screw Speed"] +
+    [f"Zone {i+1}" for i in range(10)] +
+    ["Die Temp", "Comments", "Entry ID"]
+)
+
+
+def connect_gspread(service_account_info, sheet_name=SHEET_NAME):
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    creds = Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
+    client = gspread.authorize(creds)
+    return client.open(sheet_name).sheet1
+
+
+def _is_auth_error(exc):
+    # gspread.exceptions.APIError carries the HTTP response; 401 means the token was rejected
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None) == 401
+
+
+class SheetClient:
+    # One worksheet handle per process. `connect` is a zero-argument factory returning a
+    # worksheet (real gspread or FakeWorksheet); it is called once, and again only if the
+    # session's credentials are rejected. Headers are checked on first connect only.
+
+    def __init__(self, connect, expected_headers=EXPECTED_HEADERS, keep_timings=200):
+        self._connect = connect
+        self.expected_headers = list(expected_headers)
+        self._sheet = None
+        self._lock = threading.Lock()
+        # Appended to by every session and the flush worker; read only through timing_summary
+        self.timings = deque(maxlen=keep_timings)
+        self._timings_lock = threading.Lock()
+
+    def _timed(self, name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record = {"call": name, "ms": (time.perf_counter() - start) * 1000, "at": time.time()}
+            with self._timings_lock:
+                self.timings.append(record)
+
+    def worksheet(self):
+        with self._lock:
+            if self._sheet is None:
+                sheet = self._timed("connect", self._connect)
+                self._ensure_headers(sheet)
+                self._sheet = sheet
+            return self._sheet
+
+    def _ensure_headers(self, sheet):
+        current = self._timed("row_values", sheet.row_values, 1)
+        if current != self.expected_headers:
+            self._timed("delete_rows", sheet.delete_rows, 1)
+            self._timed("insert_row", sheet.insert_row, self.expected_headers, index=1)
+
+    def reset(self):
+        with self._lock:
+            self._sheet = None
+
+    def call(self, name, *args, **kwargs):
+        # Timed worksheet call; reconnects once if the token was rejected
+        try:
+            return self._timed(name, getattr(self.worksheet(), name), *args, **kwargs)
+        except Exception as exc:
+            if not _is_auth_error(exc):
+                raise
+            self.reset()
+            return self._timed(name, getattr(self.worksheet(), name), *args, **kwargs)
+
+    def append_row(self, values):
+        return self.call("append_row", values)
+
+    def append_rows(self, rows):
+        return self.call("append_rows", rows)
+
+    def get_all_records(self):
+        return self.call("get_all_records")
+
+    def get(self, range_name, **kwargs):
+        return self.call("get", range_name, **kwargs)
+
+    def timing_summary(self):
+        with self._timings_lock:
+            timings = list(self.timings)
+        summary = {}
+        for t in timings:
+            entry = summary.setdefault(t["call"], {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["calls"] += 1
+            entry["total_ms"] += t["ms"]
+            entry["max_ms"] = max(entry["max_ms"], t["ms"])
+        for entry in summary.values():
+            entry["mean_ms"] = entry["total_ms"] / entry["calls"]
+        return summary
+
+
+class FakeWorksheet:
+    # In-memory stand-in for a gspread worksheet with a fixed per-call latency,
+    # for running the logbook and benchmarking Sheets traffic offline
+
+    def __init__(self, latency=0.0, rows=None):
+        self.latency = latency
+        self.rows = [list(r) for r in rows] if rows else []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def row_values(self, row):
+        with self._lock:
+            self._round_trip()
+            return list(self.rows[row - 1]) if len(self.rows) >= row else []
+
+    def delete_rows(self, start, end=None):
+        with self._lock:
+            self._round_trip()
+            del self.rows[start - 1:(end or start)]
+
+    def insert_row(self, values, index=1):
+        with self._lock:
+            self._round_trip()
+            self.rows.insert(index - 1, list(values))
+
+    def append_row(self, values):
+        with self._lock:
+            self._round_trip()
+            self.rows.append(list(values))
+
+    def append_rows(self, rows):
+        with self._lock:
+            self._round_trip()
+            self.rows.extend(list(r) for r in rows)
+
+    def get_all_records(self):
+        with self._lock:
+            self._round_trip()
+            if not self.rows:
+                return []
+            header = self.rows[0]
+            return [dict(zip(header, r + [""] * (len(header) - len(r)))) for r in self.rows[1:]]
+
+    def get(self, range_name, **kwargs):
+        # Only open-ended "A{row}:{col}" ranges, which is what the logbook mirror asks for
+        with self._lock:
+            self._round_trip()
+            start, end = range_name.split(":")
+            first_row = int(start.lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+            width = column_number(end.rstrip("0123456789"))
+            return [list(r[:width]) for r in self.rows[first_row - 1:]]
+
+
+def column_letter(n):
+    # 1 -> "A", 27 -> "AA"
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def column_number(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
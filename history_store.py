@@ -0,0 +1,135 @@
+import csv
+import io
+import sqlite3
+from abc import ABC, abstractmethod
+from contextlib import closing
+
+import pandas as pd
+
+HISTORY_COLUMNS = (
+    ["Timestamp", "Screw Speed"] +
+    [f"Zone {i+1}" for i in range(10)] +
+    ["Die Temp", "Comments"]
+)
+DEFAULT_HISTORY_URL = "sqlite:///extruder_history.db"
+EXPORT_BATCH_ROWS = 5000
+
+
+class HistoryStore(ABC):
+    # Interface for the Input/History pages. Backends store entries keyed by insertion
+    # order and answer paged, filtered queries without loading the full history.
+
+    @abstractmethod
+    def add(self, entry):
+        pass
+
+    @abstractmethod
+    def last_entry(self):
+        pass
+
+    @abstractmethod
+    def count(self, start=None, end=None, text=None):
+        pass
+
+    @abstractmethod
+    def page(self, offset, limit, start=None, end=None, text=None):
+        pass
+
+    @abstractmethod
+    def iter_rows(self, start=None, end=None, text=None, batch_rows=EXPORT_BATCH_ROWS):
+        pass
+
+    def write_csv(self, fileobj, start=None, end=None, text=None):
+        # Stream matching rows as CSV text into fileobj, one batch at a time
+        writer = csv.writer(fileobj, lineterminator="\n")
+        writer.writerow(HISTORY_COLUMNS)
+        for batch in self.iter_rows(start, end, text):
+            writer.writerows(batch)
+
+
+class SQLiteHistoryStore(HistoryStore):
+
+    def __init__(self, path):
+        self.path = path
+        self._columns = ", ".join(f'"{c}"' for c in HISTORY_COLUMNS)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                '"Timestamp" TEXT NOT NULL, '
+                + ", ".join(f'"{c}" REAL' for c in HISTORY_COLUMNS[1:-1])
+                + ', "Comments" TEXT)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS history_timestamp ON history ("Timestamp")')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _where(self, start, end, text):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append('"Timestamp" >= ?')
+            params.append(pd.Timestamp(start).strftime("%Y-%m-%d %H:%M:%S"))
+        if end is not None:
+            clauses.append('"Timestamp" <= ?')
+            params.append(pd.Timestamp(end).strftime("%Y-%m-%d %H:%M:%S"))
+        if text:
+            clauses.append('"Comments" LIKE ?')
+            params.append(f"%{text}%")
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def add(self, entry):
+        placeholders = ", ".join("?" for _ in HISTORY_COLUMNS)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"INSERT INTO history ({self._columns}) VALUES ({placeholders})",
+                         [entry.get(c) for c in HISTORY_COLUMNS])
+
+    def last_entry(self):
+        with closing(self._connect()) as conn:
+            row = conn.execute(f"SELECT {self._columns} FROM history ORDER BY id DESC LIMIT 1").fetchone()
+        return dict(zip(HISTORY_COLUMNS, row)) if row else None
+
+    def count(self, start=None, end=None, text=None):
+        where, params = self._where(start, end, text)
+        with closing(self._connect()) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM history{where}", params).fetchone()[0]
+
+    def page(self, offset, limit, start=None, end=None, text=None):
+        where, params = self._where(start, end, text)
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                f'SELECT {self._columns} FROM history{where} ORDER BY "Timestamp", id LIMIT ? OFFSET ?',
+                conn, params=params + [limit, offset]
+            )
+
+    def iter_rows(self, start=None, end=None, text=None, batch_rows=EXPORT_BATCH_ROWS):
+        where, params = self._where(start, end, text)
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(f'SELECT {self._columns} FROM history{where} ORDER BY "Timestamp", id', params)
+            while True:
+                batch = cursor.fetchmany(batch_rows)
+                if not batch:
+                    break
+                yield batch
+
+
+HISTORY_BACKENDS = {"sqlite": SQLiteHistoryStore}
+
+
+def open_history_store(url=DEFAULT_HISTORY_URL):
+    # "<backend>:///<location>", e.g. sqlite:///extruder_history.db
+    scheme, _, location = url.partition(":///")
+    if scheme not in HISTORY_BACKENDS:
+        raise ValueError(f"Unknown history backend '{scheme}'. Available: {', '.join(HISTORY_BACKENDS)}")
+    return HISTORY_BACKENDS[scheme](location)
+
+
+def export_csv_bytes(store, start=None, end=None, text=None):
+    # CSV export as bytes for st.download_button (which only takes bytes, text or plain
+    # file objects); rows are encoded batch by batch, no DataFrame of the history is built
+    buffer = io.BytesIO()
+    text_out = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+    store.write_csv(text_out, start, end, text)
+    text_out.flush()
+    text_out.detach()
+    return buffer.getvalue()
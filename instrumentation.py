@@ -0,0 +1,132 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+# Every finished stage is also appended to this JSON-lines file when it is set
+STAGE_LOG_FILE = os.environ.get("STAGE_LOG_FILE")
+KEEP_RECORDS = 5000
+
+
+class StageProfiler:
+    # Per-session stage timings. `stage()` records wall time, rows processed and (when
+    # memory=True) the tracemalloc peak above the stage's starting allocation. Stages may
+    # nest; a parent's peak includes its children. tracemalloc is process-wide, so with
+    # several sessions profiling memory at once the peaks include their allocations too.
+
+    def __init__(self, app, log_path=STAGE_LOG_FILE, keep=KEEP_RECORDS):
+        self.app = app
+        self.log_path = log_path
+        self.records = deque(maxlen=keep)
+        self.run = 0
+        self.memory = False
+        self._stack = []
+        self._lock = threading.Lock()
+        self._started_tracing = False
+
+    def start_run(self, memory=False):
+        # Call once at the top of each rerun; returns the new run number
+        self.run += 1
+        self.memory = memory
+        self._stack = []
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        elif not memory and self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return self.run
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        # `with profiler.stage("parse") as rec: ...; rec["rows"] = len(df)`
+        record = {"app": self.app, "run": self.run, "stage": name, "rows": rows,
+                  "depth": len(self._stack), "at": time.time()}
+        tracing = self.memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]["_peak"] = max(self._stack[-1]["_peak"], peak)
+            tracemalloc.reset_peak()
+            record["_base"], record["_peak"] = current, 0
+        self._stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["ms"] = (time.perf_counter() - start) * 1000
+            self._stack.pop()
+            record["peak_mb"] = None
+            if tracing and tracemalloc.is_tracing():
+                peak = max(tracemalloc.get_traced_memory()[1], record.pop("_peak"))
+                record["peak_mb"] = max(peak - record.pop("_base"), 0) / 2**20
+                if self._stack:
+                    self._stack[-1]["_peak"] = max(self._stack[-1]["_peak"], peak)
+            self._finish(record)
+
+    def timed(self, name=None, rows=None):
+        # Decorator form of stage(); rows(result) gives the row count of the return value
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name or fn.__name__) as record:
+                    result = fn(*args, **kwargs)
+                    if rows is not None:
+                        record["rows"] = rows(result)
+                    return result
+            return wrapper
+        return decorate
+
+    def _finish(self, record):
+        record = {k: v for k, v in record.items() if not k.startswith("_")}
+        with self._lock:
+            self.records.append(record)
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as log:
+                    log.write(json.dumps(record) + "\n")
+
+    def last_run(self):
+        # Records of the latest rerun, in the order the stages started
+        with self._lock:
+            rows = [r for r in self.records if r["run"] == self.run]
+        return sorted(rows, key=lambda r: r["at"])
+
+    def to_jsonl(self):
+        with self._lock:
+            return "".join(json.dumps(r) + "\n" for r in self.records).encode("utf-8")
+
+
+def session_profiler(app):
+    # The current Streamlit session's profiler, with a sidebar toggle; starts a new run
+    import streamlit as st
+
+    profiler = st.session_state.get("_stage_profiler")
+    if profiler is None:
+        profiler = st.session_state["_stage_profiler"] = StageProfiler(app)
+    memory = st.sidebar.checkbox("🛠️ Debug: stage timings and memory", value=False, key="_stage_profiler_debug")
+    profiler.start_run(memory=memory)
+    return profiler
+
+
+def show_profiler_panel(profiler):
+    # Sidebar table of the latest rerun's stages plus a JSON-lines download of all records;
+    # only shown while the debug toggle is on
+    import pandas as pd
+    import streamlit as st
+
+    if not st.session_state.get("_stage_profiler_debug"):
+        return
+    with st.sidebar.expander("⏱️ Stage timings (this rerun)", expanded=True):
+        rows = profiler.last_run()
+        if rows:
+            table = pd.DataFrame(rows)
+            table["stage"] = ["· " * d + s for d, s in zip(table["depth"], table["stage"])]
+            st.dataframe(table[["stage", "ms", "rows", "peak_mb"]].round(2), hide_index=True, use_container_width=True)
+        else:
+            st.caption("No stages recorded yet.")
+        st.download_button("Download timings (JSON lines)", profiler.to_jsonl(),
+                           f"{profiler.app}_stages.jsonl", "application/x-ndjson")
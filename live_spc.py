@@ -0,0 +1,318 @@
+import threading
+import time
+from collections import deque
+
+import matplotlib.dates as mdates
+import numpy as np
+from matplotlib.figure import Figure
+
+from actval_ingest import ActValSchema, clean_chunk, read_chunks, MAIN_PARAMETERS, ZONE_MARKER
+
+LIVE_CHANNELS = [f"Zone_{i+1}" for i in range(10)] + ["Screw_Speed"]
+# ActVal column feeding each live channel when a recorded file is replayed
+REPLAY_COLUMNS = {
+    **{f"Zone_{i+1}": f"{ZONE_MARKER} {i+1}" for i in range(10)},
+    "Screw_Speed": MAIN_PARAMETERS['Screw Speed'],
+}
+REPLAY_SPEEDUPS = [1, 10, 100, 1000]
+REPLAY_POLL_SECONDS = 0.05
+# A replayed sample more than this far behind schedule is skipped and counted as dropped
+REPLAY_MAX_BACKLOG_SECONDS = 5.0
+# At most this many samples are handed over per poll; the rest wait (and may go stale)
+REPLAY_MAX_BATCH = 10_000
+
+
+class RingBuffer:
+    # Fixed-size window of the latest samples for every live channel. Window mean and std
+    # are kept as running sums updated when a sample enters and when one falls out.
+
+    def __init__(self, capacity, channels=LIVE_CHANNELS):
+        self.capacity = capacity
+        self.channels = list(channels)
+        self.times = np.zeros(capacity, dtype='datetime64[ns]')
+        self.values = np.zeros((capacity, len(self.channels)))
+        self.head = 0
+        self.size = 0
+        self.version = 0
+        self.lock = threading.Lock()
+        # Wall time the newest sample was due at its source, for end-to-end lag
+        self.last_due = None
+        # Sums are taken relative to the first sample so x² stays well conditioned
+        self.shift = None
+        self.sum = np.zeros(len(self.channels))
+        self.sumsq = np.zeros(len(self.channels))
+        self._evictions = 0
+
+    def push(self, timestamp, row, due=None):
+        row = np.asarray(row, dtype='float64')
+        with self.lock:
+            self.last_due = due
+            if self.shift is None:
+                self.shift = row.copy()
+            if self.size == self.capacity:
+                old = self.values[self.head] - self.shift
+                self.sum -= old
+                self.sumsq -= old * old
+                self._evictions += 1
+            else:
+                self.size += 1
+            self.values[self.head] = row
+            self.times[self.head] = np.datetime64(timestamp, 'ns')
+            centered = row - self.shift
+            self.sum += centered
+            self.sumsq += centered * centered
+            self.head = (self.head + 1) % self.capacity
+            self.version += 1
+            # Once per full turn, recompute the sums exactly so subtraction error cannot build up
+            if self._evictions >= self.capacity:
+                centered = self.values - self.shift
+                self.sum = centered.sum(axis=0)
+                self.sumsq = (centered * centered).sum(axis=0)
+                self._evictions = 0
+
+    def _stats(self):
+        n = self.size
+        if n == 0:
+            nan = np.full(len(self.channels), np.nan)
+            return nan, nan
+        mean = self.shift + self.sum / n
+        if n < 2:
+            return mean, np.full(len(self.channels), np.nan)
+        var = (self.sumsq - self.sum * self.sum / n) / (n - 1)
+        return mean, np.sqrt(np.clip(var, 0, None))
+
+    def stats(self):
+        with self.lock:
+            return self._stats()
+
+    def snapshot(self):
+        # Samples in time order plus window mean/std, all copied under one lock
+        with self.lock:
+            order = (self.head - self.size + np.arange(self.size)) % self.capacity
+            mean, std = self._stats()
+            return self.times[order], self.values[order], mean, std
+
+
+class LiveSource:
+    # Where live samples come from. poll(now) returns the samples due by wall time `now`
+    # as (timestamp, row, due) tuples, oldest first; `due` is the wall time the sample
+    # should have arrived, so lag can be measured end to end. Rows follow LIVE_CHANNELS.
+    name = "source"
+    dropped = 0
+    finished = False
+
+    def poll(self, now):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FunctionSource(LiveSource):
+    # One sample from sample_fn() per poll; the sampler's interval sets the rate
+
+    def __init__(self, sample_fn, name="simulated"):
+        self.sample_fn = sample_fn
+        self.name = name
+
+    def poll(self, now):
+        timestamp, row = self.sample_fn()
+        return [(timestamp, row, now)]
+
+
+class ActValReplaySource(LiveSource):
+    # Replays a recorded ActVal CSV at `speedup` times its recorded pace, chunk by chunk.
+    # Zone N and screw speed map onto the live channels (REPLAY_COLUMNS); channels the file
+    # lacks are fed as 0 and listed in `missing_channels`. Timestamps keep the recorded
+    # clock and, when looping, continue past the end instead of jumping back.
+
+    def __init__(self, path, speedup=1.0, loop=True, max_backlog=REPLAY_MAX_BACKLOG_SECONDS,
+                 max_batch=REPLAY_MAX_BATCH, channels=LIVE_CHANNELS):
+        self.path = path
+        self.speedup = float(speedup)
+        self.loop = loop
+        self.max_backlog = max_backlog
+        self.max_batch = max_batch
+        self.channels = list(channels)
+        self.name = f"replay ×{speedup:g}"
+        self._file = open(path, "rb")
+        try:
+            self.schema = ActValSchema.sniff(self._file)
+            self.missing_channels = [ch for ch in self.channels if REPLAY_COLUMNS[ch] not in self.schema.header]
+            if len(self.missing_channels) == len(self.channels):
+                raise ValueError(f"{path} has none of the live channels' ActVal columns.")
+        except Exception:
+            self._file.close()
+            raise
+        self.dropped = 0
+        self.delivered = 0
+        self.loops = 0
+        self._start_wall = None
+        self._first_ns = None
+        self._offset_ns = 0
+        self._last_ns = None
+        self._step_ns = 0
+        self._chunks = None
+        self._times = np.empty(0, dtype='int64')
+        self._values = np.empty((0, len(self.channels)))
+        self._pos = 0
+
+    def _next_chunk(self):
+        # Load the next cleaned chunk into (times ns, values); False at end of file without loop
+        while True:
+            if self._chunks is None:
+                # Without explicit dtypes a chart column with text in it is coerced instead of
+                # stopping the replay; replay is paced, so the slower parse does not matter
+                self._chunks = iter(read_chunks(self._file, self.schema, all_columns=False, explicit_dtypes=False))
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                if not self.loop or self._last_ns is None:
+                    return False
+                # Next pass starts one sample interval after this one ended
+                self._offset_ns += self._last_ns - self._first_ns + self._step_ns
+                self._chunks = None
+                self.loops += 1
+                continue
+            chunk, _ = clean_chunk(chunk, self.schema.chart_columns, 0.0, self.schema.date_format)
+            if not len(chunk):
+                continue
+            times = chunk.index.values.astype('datetime64[ns]').astype('int64')
+            if self._first_ns is None:
+                self._first_ns = int(times[0])
+                self._step_ns = int(np.median(np.diff(times[:1000]))) if len(times) > 1 else 10**9
+            self._last_ns = int(times[-1])
+            values = np.zeros((len(chunk), len(self.channels)))
+            for k, ch in enumerate(self.channels):
+                if ch not in self.missing_channels:
+                    values[:, k] = chunk[REPLAY_COLUMNS[ch]].to_numpy(dtype='float64')
+            self._times = times + self._offset_ns
+            self._values = values
+            self._pos = 0
+            return True
+
+    def poll(self, now):
+        if self._start_wall is None:
+            self._start_wall = now
+        out = []
+        while not self.finished and len(out) < self.max_batch:
+            if self._pos >= len(self._times) and not self._next_chunk():
+                self.finished = True
+                break
+            due = self._start_wall + (self._times[self._pos:] - self._first_ns) / 1e9 / self.speedup
+            ready = int(np.searchsorted(due, now, side='right'))
+            # Too far behind schedule: skip ahead rather than fall further behind
+            stale = int(np.searchsorted(due[:ready], now - self.max_backlog, side='left'))
+            self.dropped += stale
+            ready = min(ready, stale + self.max_batch - len(out))
+            for k in range(stale, ready):
+                i = self._pos + k
+                out.append((np.datetime64(int(self._times[i]), 'ns'), self._values[i], float(due[k])))
+            self._pos += ready
+            if self._pos < len(self._times):
+                break
+        self.delivered += len(out)
+        return out
+
+    def close(self):
+        self._file.close()
+
+
+class LiveSampler(threading.Thread):
+    # Background thread that polls a LiveSource every interval and pushes what is due into a
+    # RingBuffer (and into `monitor`, if given, which sees every sample, not just the window).
+    # Keeps the recent ingest lag (push time minus due time) and delivery rate. If the source
+    # or monitor raises, the thread stops and keeps the exception in `error` for the page.
+
+    def __init__(self, buffer, source, interval, monitor=None, keep=1000):
+        super().__init__(daemon=True)
+        self.buffer = buffer
+        self.source = source
+        self.monitor = monitor
+        self.interval = interval
+        self.next_sample_at = time.time()
+        self.delivered = 0
+        self.ingest_lag = deque(maxlen=keep)
+        self.error = None
+        self._deliveries = deque(maxlen=keep)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set() and not self.source.finished:
+                batch = self.source.poll(time.time())
+                for timestamp, row, due in batch:
+                    self.buffer.push(timestamp, row, due)
+                    if self.monitor is not None:
+                        self.monitor.update(timestamp, row)
+                if batch:
+                    pushed_at = time.time()
+                    self.delivered += len(batch)
+                    self.ingest_lag.append(pushed_at - batch[-1][2])
+                    self._deliveries.append((pushed_at, self.delivered))
+                self.next_sample_at += self.interval
+                self._stop_event.wait(max(self.next_sample_at - time.time(), 0))
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self.source.close()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def rate(self, seconds=5.0):
+        # Samples per second delivered over roughly the last `seconds`
+        recent = [d for d in list(self._deliveries) if d[0] >= time.time() - seconds]
+        if len(recent) < 2 or recent[-1][0] == recent[0][0]:
+            return 0.0
+        return (recent[-1][1] - recent[0][1]) / (recent[-1][0] - recent[0][0])
+
+
+class LiveChartPanel:
+    # Figures and line artists for the live SPC charts, built once per session and
+    # updated in place with set_data / set_ydata instead of being recreated each refresh.
+    # Figures are created without pyplot so they never pile up in its global registry.
+
+    def __init__(self, channels, titles, ylabels, colors, combined=False):
+        self.channels = list(channels)
+        self.titles = list(titles)
+        self.combined = combined
+        self.render_ms = []
+        if combined:
+            fig = Figure(figsize=(10, 2.2 * len(self.channels)), layout='constrained')
+            axes = fig.subplots(len(self.channels), 1, sharex=True)
+            self.figures = [fig]
+        else:
+            self.figures = [Figure(layout='constrained') for _ in self.channels]
+            axes = [fig.subplots() for fig in self.figures]
+
+        self.axes = list(axes)
+        self.artists = []
+        for ax, title, ylabel, color in zip(self.axes, titles, ylabels, colors):
+            line, = ax.plot([], [], label='Value', color=color)
+            mean = ax.axhline(0, color='green', linestyle='--', label='Mean')
+            ucl = ax.axhline(0, color='red', linestyle='--', label='UCL')
+            lcl = ax.axhline(0, color='red', linestyle='--', label='LCL')
+            ax.xaxis_date()
+            ax.set_ylabel(ylabel)
+            if combined:
+                ax.set_title(title, fontsize=9, loc='left')
+            else:
+                ax.set_xlabel('Time')
+            ax.legend(loc='upper left', fontsize=7)
+            self.artists.append((line, mean, ucl, lcl))
+        if combined:
+            self.axes[-1].set_xlabel('Time')
+
+    def update(self, times, values, means, stds):
+        x = mdates.date2num(times)
+        for k, (ax, (line, mean, ucl, lcl)) in enumerate(zip(self.axes, self.artists)):
+            m, s = means[k], stds[k]
+            line.set_data(x, values[:, k])
+            mean.set_ydata([m, m])
+            ucl.set_ydata([m + 3 * s, m + 3 * s])
+            lcl.set_ydata([m - 3 * s, m - 3 * s])
+            ax.relim()
+            ax.autoscale_view()
+
+    def record_render(self, ms, keep=50):
+        self.render_ms = (self.render_ms + [ms])[-keep:]
@@ -0,0 +1,108 @@
+import csv
+import io
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import pandas as pd
+
+from gsheet_client import EXPECTED_HEADERS, column_letter
+
+MIN_SYNC_SECONDS = 10
+
+
+class LogbookMirror:
+    # Local SQLite copy of the logbook sheet. Rows are keyed by their sheet row number, so
+    # a sync only fetches rows below the last one already mirrored (one range read).
+
+    def __init__(self, path, headers=EXPECTED_HEADERS, min_sync_seconds=MIN_SYNC_SECONDS):
+        self.path = path
+        self.headers = list(headers)
+        self.min_sync_seconds = min_sync_seconds
+        self.last_sync = 0.0
+        self._lock = threading.Lock()
+        self._columns = ", ".join(f'"{h}"' for h in self.headers)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # The mirror is only a cache: start over if the sheet's columns have changed
+            existing = [r[1] for r in conn.execute("PRAGMA table_info(log)")]
+            if existing and existing != ["sheet_row"] + self.headers:
+                conn.execute("DROP TABLE log")
+            # Columns are untyped so numbers and text keep the type Sheets returned
+            conn.execute(f"CREATE TABLE IF NOT EXISTS log (sheet_row INTEGER PRIMARY KEY, {self._columns})")
+            if "Entry ID" in self.headers:
+                conn.execute('CREATE INDEX IF NOT EXISTS log_entry_id ON log ("Entry ID")')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def last_row(self):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT MAX(sheet_row) FROM log").fetchone()[0]
+        return row or 1  # row 1 holds the headers
+
+    def sync(self, client, force=False, full=False):
+        # Fetch rows appended to the sheet since the last sync; returns how many were added.
+        # full=True refetches every row and swaps them in only once the read has succeeded.
+        with self._lock:
+            if not force and time.time() - self.last_sync < self.min_sync_seconds:
+                return 0
+            first = 2 if full else self.last_row() + 1
+            values = client.get(f"A{first}:{column_letter(len(self.headers))}",
+                                value_render_option="UNFORMATTED_VALUE")
+            rows = [
+                (first + k, *(list(r) + [""] * (len(self.headers) - len(r)))[:len(self.headers)])
+                for k, r in enumerate(values)
+            ]
+            if rows or full:
+                placeholders = ", ".join("?" for _ in range(len(self.headers) + 1))
+                with closing(self._connect()) as conn, conn:
+                    if full:
+                        conn.execute("DELETE FROM log")
+                    conn.executemany(f"INSERT OR REPLACE INTO log (sheet_row, {self._columns}) VALUES ({placeholders})", rows)
+            self.last_sync = time.time()
+            return len(rows)
+
+    def rebuild(self, client):
+        # Full resync, for when rows were edited or deleted directly in the sheet
+        return self.sync(client, force=True, full=True)
+
+    def existing_ids(self, client, entry_ids):
+        # Which of these Entry IDs are already in the sheet (syncs first)
+        self.sync(client, force=True)
+        placeholders = ", ".join("?" for _ in entry_ids)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f'SELECT "Entry ID" FROM log WHERE "Entry ID" IN ({placeholders})', list(entry_ids))
+            return [r[0] for r in rows]
+
+    def count(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM log").fetchone()[0]
+
+    def last_entry(self):
+        with closing(self._connect()) as conn:
+            row = conn.execute(f"SELECT {self._columns} FROM log ORDER BY sheet_row DESC LIMIT 1").fetchone()
+        return dict(zip(self.headers, row)) if row else None
+
+    def page(self, page_number, page_size):
+        # One page of history, newest entries last as in the sheet
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                f"SELECT {self._columns} FROM log ORDER BY sheet_row LIMIT ? OFFSET ?",
+                conn, params=[page_size, page_number * page_size]
+            )
+
+    def to_csv_bytes(self, batch_rows=5000):
+        # CSV export built from cursor batches, without a DataFrame of the whole log
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(self.headers)
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(f"SELECT {self._columns} FROM log ORDER BY sheet_row")
+            while True:
+                batch = cursor.fetchmany(batch_rows)
+                if not batch:
+                    break
+                writer.writerows(batch)
+        return out.getvalue().encode("utf-8")
@@ -0,0 +1,191 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+
+FLUSH_BATCH = 50
+POLL_SECONDS = 2.0
+BACKOFF_BASE_SECONDS = 5.0
+BACKOFF_MAX_SECONDS = 300.0
+# An in-flight batch older than this is assumed lost (crash or hung request) and retried
+INFLIGHT_TIMEOUT_SECONDS = 300.0
+# Sent entries are kept this long (for auditing a batch) and pruned about once per PRUNE_INTERVAL_SECONDS
+SENT_RETENTION_SECONDS = 7 * 24 * 3600.0
+PRUNE_INTERVAL_SECONDS = 3600.0
+
+log = logging.getLogger(__name__)
+
+
+class SubmissionQueue:
+    # Durable write-behind journal for logbook entries. Submit only inserts a row here;
+    # FlushWorker moves entries to Sheets later. Every entry carries a unique Entry ID
+    # that is written to the sheet, so a retried batch never appends an entry twice.
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS submissions ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "entry_id TEXT UNIQUE NOT NULL, "
+                "row TEXT NOT NULL, "
+                "status TEXT NOT NULL DEFAULT 'pending', "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt REAL NOT NULL DEFAULT 0, "
+                "claimed_at REAL, "
+                "last_error TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS submissions_status ON submissions (status, next_attempt)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def enqueue(self, values):
+        # Journal one sheet row; the Entry ID is appended as its last cell
+        entry_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT INTO submissions (entry_id, row) VALUES (?, ?)",
+                         (entry_id, json.dumps(list(values) + [entry_id])))
+        return entry_id
+
+    def depth(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM submissions WHERE status != 'sent'").fetchone()[0]
+
+    def last_unsent(self):
+        # Newest entry not yet in the sheet, so the form can pre-fill from it
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT row FROM submissions WHERE status != 'sent' ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def claim(self, limit=FLUSH_BATCH):
+        # Atomically mark the next due entries in-flight; returns [(id, entry_id, row, attempts)]
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, entry_id, row, attempts FROM submissions "
+                "WHERE (status = 'pending' AND next_attempt <= ?) "
+                "OR (status = 'inflight' AND claimed_at < ?) "
+                "ORDER BY id LIMIT ?",
+                (now, now - INFLIGHT_TIMEOUT_SECONDS, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE submissions SET status = 'inflight', claimed_at = ?, attempts = attempts + 1 WHERE id = ?",
+                [(now, r[0]) for r in rows]
+            )
+            conn.commit()
+        return [(r[0], r[1], json.loads(r[2]), r[3] + 1) for r in rows]
+
+    def mark_sent(self, ids):
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("UPDATE submissions SET status = 'sent', last_error = NULL WHERE id = ?",
+                             [(i,) for i in ids])
+
+    def mark_failed(self, claimed, error):
+        # Back off exponentially per entry: 5 s, 10 s, 20 s, ... capped at 5 minutes
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "UPDATE submissions SET status = 'pending', next_attempt = ?, last_error = ? WHERE id = ?",
+                [(now + min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS), str(error), i)
+                 for i, _, _, attempts in claimed]
+            )
+
+    def prune_sent(self, older_than=SENT_RETENTION_SECONDS):
+        # Delete entries that reached the sheet more than `older_than` seconds ago
+        # (claimed_at is when their batch was sent); returns the number removed
+        with closing(self._connect()) as conn, conn:
+            return conn.execute("DELETE FROM submissions WHERE status = 'sent' AND claimed_at < ?",
+                                (time.time() - older_than,)).rowcount
+
+    def last_error(self):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT last_error FROM submissions WHERE status != 'sent' AND last_error IS NOT NULL "
+                "ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        return row[0] if row else None
+
+
+class FlushWorker(threading.Thread):
+    # Background thread that appends journaled entries to the sheet in batches.
+    # `existing_ids(entry_ids)` returns the IDs already present in the sheet; it is only
+    # consulted for retried entries, whose previous append may have landed.
+    # `on_flushed()` runs after each successful batch. Failures are logged and counted, and
+    # the latest one is kept in last_error for the UI.
+
+    def __init__(self, queue, client, existing_ids, on_flushed=None, batch=FLUSH_BATCH, poll=POLL_SECONDS):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.client = client
+        self.existing_ids = existing_ids
+        self.on_flushed = on_flushed
+        self.batch = batch
+        self.poll = poll
+        self.last_flush_ms = None
+        self.last_flush_at = None
+        self.last_flush_rows = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_error_at = None
+        self.retention = SENT_RETENTION_SECONDS
+        self._pruned_at = 0.0
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                flushed = self.flush_once()
+                if time.time() - self._pruned_at > PRUNE_INTERVAL_SECONDS:
+                    self.queue.prune_sent(self.retention)
+                    self._pruned_at = time.time()
+            except Exception as exc:
+                self._record_failure(exc)
+                flushed = 0
+            if not flushed:
+                self._wake.wait(self.poll)
+                self._wake.clear()
+
+    def _record_failure(self, exc):
+        log.warning("Logbook flush failed: %s", exc, exc_info=exc)
+        self.failures += 1
+        self.last_error = f"{type(exc).__name__}: {exc}"
+        self.last_error_at = time.time()
+
+    def flush_once(self):
+        claimed = self.queue.claim(self.batch)
+        if not claimed:
+            return 0
+        start = time.perf_counter()
+        try:
+            retried = [entry_id for _, entry_id, _, attempts in claimed if attempts > 1]
+            already = set(self.existing_ids(retried)) if retried else set()
+            rows = [row for _, entry_id, row, _ in claimed if entry_id not in already]
+            if rows:
+                self.client.append_rows(rows)
+        except Exception as exc:
+            self.queue.mark_failed(claimed, exc)
+            self._record_failure(exc)
+            return 0
+        self.queue.mark_sent([i for i, _, _, _ in claimed])
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+        self.last_flush_at = time.time()
+        self.last_flush_rows = len(rows)
+        if self.on_flushed is not None:
+            self.on_flushed()
+        return len(claimed)
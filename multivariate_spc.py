@@ -0,0 +1,181 @@
+import threading
+from collections import deque
+from statistics import NormalDist
+
+import matplotlib.dates as mdates
+import numpy as np
+import pandas as pd
+from matplotlib.colors import ListedColormap
+from matplotlib.figure import Figure
+
+T2_ALPHA = 0.0027
+EWMA_LAMBDA = 0.2
+EWMA_L = 3.0
+CUSUM_K = 0.5
+CUSUM_H = 5.0
+# The inverse covariance is rebuilt exactly every this many samples so rank-1 error cannot build up
+MV_REFRESH = 1000
+MV_HISTORY = 500
+
+# Alarm codes per channel and sample, as drawn in the alarm strip
+ALARM_NONE, ALARM_EWMA, ALARM_CUSUM, ALARM_BOTH = 0, 1, 2, 3
+
+
+def chi2_quantile(dof, q):
+    # Wilson–Hilferty approximation; within ~1% of the exact quantile for dof >= 3
+    z = NormalDist().inv_cdf(q)
+    c = 2.0 / (9.0 * dof)
+    return dof * (1.0 - c + z * np.sqrt(c)) ** 3
+
+
+class MultivariateMonitor:
+    # Streaming Hotelling T² over all channels plus EWMA and CUSUM per channel.
+    # Mean and the sum of squared deviations (M2) follow Welford's update, and the inverse
+    # of M2 follows Sherman–Morrison, so every sample costs O(p²) whatever the history length.
+    # Each sample is scored against the statistics of the samples before it, then folded in.
+    # T² is only scored once `warmup` samples (default 5p) have been seen.
+
+    def __init__(self, channels, warmup=None, history=MV_HISTORY, alpha=T2_ALPHA,
+                 ewma_lambda=EWMA_LAMBDA, ewma_l=EWMA_L, cusum_k=CUSUM_K, cusum_h=CUSUM_H, refresh=MV_REFRESH):
+        self.channels = list(channels)
+        p = len(self.channels)
+        self.warmup = max(warmup or 5 * p, p + 2)
+        self.ucl = chi2_quantile(p, 1 - alpha)
+        self.ewma_lambda = ewma_lambda
+        self.ewma_l = ewma_l
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.refresh = refresh
+        self.lock = threading.Lock()
+
+        self.n = 0
+        self.mean = np.zeros(p)
+        self.m2 = np.zeros((p, p))
+        self.m2_inv = None
+        self.ewma = None
+        self.ewma_steps = 0
+        self.cusum_hi = np.zeros(p)
+        self.cusum_lo = np.zeros(p)
+        self.history = deque(maxlen=history)
+        self.alarm_counts = {'t2': 0, 'ewma': np.zeros(p, dtype='int64'), 'cusum': np.zeros(p, dtype='int64')}
+
+    def _rebuild_inverse(self):
+        # Small ridge so a flat channel (e.g. one the source does not provide) stays invertible
+        ridge = 1e-9 * max(np.trace(self.m2) / len(self.channels), 1e-12)
+        self.m2_inv = np.linalg.inv(self.m2 + ridge * np.eye(len(self.channels)))
+
+    def update(self, timestamp, row):
+        x = np.asarray(row, dtype='float64')
+        with self.lock:
+            n = self.n
+            d = x - self.mean
+            u = q = None
+            if self.m2_inv is not None:
+                u = self.m2_inv @ d
+                q = float(d @ u)
+                self._score(timestamp, x, d, n, q)
+
+            # Welford: fold x into the mean and M2, and M2's inverse by Sherman–Morrison
+            c = n / (n + 1)
+            self.mean += d / (n + 1)
+            self.m2 += c * np.outer(d, d)
+            if u is not None:
+                self.m2_inv -= (c / (1 + c * q)) * np.outer(u, u)
+            self.n = n + 1
+            if self.n == self.warmup or (self.n > self.warmup and (self.n - self.warmup) % self.refresh == 0):
+                self._rebuild_inverse()
+            if self.n == self.warmup:
+                self.ewma = self.mean.copy()
+
+    def _score(self, timestamp, x, d, n, q):
+        t2 = (n - 1) * q
+        sd = np.sqrt(np.diag(self.m2) / (n - 1))
+        z = np.divide(d, sd, out=np.zeros_like(d), where=sd > 0)
+
+        lam = self.ewma_lambda
+        self.ewma = lam * x + (1 - lam) * self.ewma
+        self.ewma_steps += 1
+        limit = self.ewma_l * sd * np.sqrt(lam / (2 - lam) * (1 - (1 - lam) ** (2 * self.ewma_steps)))
+        ewma_alarm = np.abs(self.ewma - self.mean) > limit
+
+        self.cusum_hi = np.maximum(0.0, self.cusum_hi + z - self.cusum_k)
+        self.cusum_lo = np.maximum(0.0, self.cusum_lo - z - self.cusum_k)
+        cusum_alarm = (self.cusum_hi > self.cusum_h) | (self.cusum_lo > self.cusum_h)
+
+        self.alarm_counts['t2'] += int(t2 > self.ucl)
+        self.alarm_counts['ewma'] += ewma_alarm
+        self.alarm_counts['cusum'] += cusum_alarm
+        codes = ewma_alarm * ALARM_EWMA + cusum_alarm * ALARM_CUSUM
+        self.history.append((np.datetime64(timestamp, 'ns'), t2, codes.astype('int8'), z))
+
+    def snapshot(self):
+        # Recent scores in time order: times, T², alarm codes (samples × channels), z-scores
+        with self.lock:
+            rows = list(self.history)
+            counts = {k: (v.copy() if isinstance(v, np.ndarray) else v) for k, v in self.alarm_counts.items()}
+        p = len(self.channels)
+        if not rows:
+            return np.empty(0, dtype='datetime64[ns]'), np.empty(0), np.empty((0, p), dtype='int8'), np.empty((0, p)), counts
+        times, t2, codes, z = zip(*rows)
+        return np.array(times), np.array(t2), np.vstack(codes), np.vstack(z), counts
+
+    def summary(self, codes, z, counts):
+        # One row per channel: current z-score, current EWMA/CUSUM state and alarm totals
+        current = codes[-1] if len(codes) else np.zeros(len(self.channels), dtype='int8')
+        return pd.DataFrame({
+            'z': np.round(z[-1], 2) if len(z) else np.nan,
+            'EWMA alarm': (current & ALARM_EWMA) > 0,
+            'CUSUM alarm': (current & ALARM_CUSUM) > 0,
+            'EWMA alarms (total)': counts['ewma'],
+            'CUSUM alarms (total)': counts['cusum'],
+        }, index=self.channels)
+
+
+class AlarmChartPanel:
+    # One figure for the whole monitor: T² against its UCL on top, and below it a strip of
+    # channels × time coloured by EWMA / CUSUM alarms. Built once and updated in place.
+
+    def __init__(self, channels, ucl):
+        self.channels = list(channels)
+        self.render_ms = []
+        self.figure = Figure(figsize=(10, 6), layout='constrained')
+        self.ax_t2, self.ax_alarms = self.figure.subplots(
+            2, 1, sharex=True, gridspec_kw={'height_ratios': [2, 1.4]}
+        )
+        self.t2_line, = self.ax_t2.plot([], [], color='C0', label='T²')
+        self.ucl_line = self.ax_t2.axhline(ucl, color='red', linestyle='--', label=f'UCL = {ucl:.1f}')
+        self.t2_points, = self.ax_t2.plot([], [], 'ro', markersize=4, label='T² > UCL')
+        self.ax_t2.set_title('Hotelling T² (all zones + screw speed)', fontsize=10, loc='left')
+        self.ax_t2.set_ylabel('T²')
+        self.ax_t2.legend(loc='upper left', fontsize=7)
+        self.ax_t2.xaxis_date()
+
+        colors = ListedColormap(['#f0f0f0', '#f5b041', '#5dade2', '#c0392b'])
+        self.image = self.ax_alarms.imshow(
+            np.zeros((len(self.channels), 1)), aspect='auto', cmap=colors, vmin=0, vmax=3,
+            interpolation='nearest', origin='lower', extent=(0, 1, -0.5, len(self.channels) - 0.5)
+        )
+        self.ax_alarms.set_yticks(range(len(self.channels)), self.channels, fontsize=7)
+        self.ax_alarms.set_title('Per-channel alarms: orange EWMA · blue CUSUM · red both', fontsize=10, loc='left')
+        self.ax_alarms.set_xlabel('Time')
+        locator = mdates.AutoDateLocator()
+        self.ax_alarms.xaxis.set_major_locator(locator)
+        self.ax_alarms.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
+    def update(self, times, t2, codes, ucl):
+        if not len(times):
+            return
+        x = mdates.date2num(times)
+        self.t2_line.set_data(x, t2)
+        out = t2 > ucl
+        self.t2_points.set_data(x[out], t2[out])
+        self.ucl_line.set_ydata([ucl, ucl])
+        self.ax_t2.relim()
+        self.ax_t2.autoscale_view()
+        self.image.set_data(codes.T)
+        right = x[-1] if x[-1] > x[0] else x[0] + 1e-6
+        self.image.set_extent((x[0], right, -0.5, len(self.channels) - 0.5))
+        self.ax_alarms.set_xlim(x[0], right)
+
+    def record_render(self, ms, keep=50):
+        self.render_ms = (self.render_ms + [ms])[-keep:]
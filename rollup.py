@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+# (name, bucket width in ns), finest first
+ROLLUP_LEVELS = [('1s', 10**9), ('1min', 60 * 10**9), ('1h', 3600 * 10**9)]
+
+# Every per-bucket statistic is mergeable, so buckets combine exactly across levels and appends
+_REDUCE = {
+    'count': np.add, 'sum': np.add, 'sumsq': np.add, 'min': np.minimum, 'max': np.maximum,
+}
+
+
+def _to_ns(ts):
+    return np.datetime64(pd.Timestamp(ts), 'ns').astype('int64')
+
+
+def _reduce_sorted(keys, arrays):
+    # Combine consecutive rows sharing a bucket key (keys sorted ascending)
+    firsts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[firsts], {k: _REDUCE[k].reduceat(a, firsts, axis=0) for k, a in arrays.items()}
+
+
+class RollupPyramid:
+    # Count / sum / sum of squares / min / max per time bucket at several resolutions.
+    # Built once per dataset and extended in place as new rows arrive. Rows older than the
+    # latest bucket (e.g. saves that committed out of order) are merged into place.
+
+    def __init__(self, columns, levels=ROLLUP_LEVELS):
+        self.columns = list(columns)
+        self.widths = dict(levels)
+        self.names = [name for name, _ in levels]
+        self.levels = {name: None for name in self.names}
+        self.last_time = None
+
+    @classmethod
+    def from_frame(cls, frame, columns=None, levels=ROLLUP_LEVELS):
+        if columns is None:
+            columns = frame.select_dtypes(include=[np.number]).columns
+        pyramid = cls(columns, levels)
+        pyramid.extend(frame)
+        return pyramid
+
+    def extend(self, frame):
+        if frame.empty:
+            return
+        times = frame.index.values.astype('datetime64[ns]').astype('int64')
+        values = frame[self.columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64')
+        if not (times[1:] >= times[:-1]).all():
+            order = np.argsort(times, kind='stable')
+            times, values = times[order], values[order]
+        self.last_time = times[-1] if self.last_time is None else max(self.last_time, times[-1])
+
+        valid = ~np.isnan(values)
+        delta = {
+            'count': valid.astype('int64'),
+            'sum': np.where(valid, values, 0.0),
+            'sumsq': np.where(valid, values * values, 0.0),
+            'min': np.where(valid, values, np.inf),
+            'max': np.where(valid, values, -np.inf),
+        }
+        keys = times
+        # Cascade the new rows' aggregates upward, merging each level's first new bucket into its tail
+        for name in self.names:
+            width = self.widths[name]
+            keys, delta = _reduce_sorted((keys // width) * width, delta)
+            self._merge(name, keys, delta)
+
+    def _merge(self, name, starts, delta):
+        level = self.levels[name]
+        if level is None:
+            self.levels[name] = {'start': starts.copy(), **{k: a.copy() for k, a in delta.items()}}
+            return
+        if starts[0] < level['start'][-1]:
+            # Late rows: re-reduce the level with the new buckets sorted into place
+            keys = np.concatenate((level['start'], starts))
+            order = np.argsort(keys, kind='stable')
+            keys, merged = _reduce_sorted(keys[order], {k: np.concatenate((level[k], a))[order] for k, a in delta.items()})
+            self.levels[name] = {'start': keys, **merged}
+            return
+        if level['start'][-1] == starts[0]:
+            for k, a in delta.items():
+                level[k][-1] = _REDUCE[k](level[k][-1], a[0])
+            starts = starts[1:]
+            delta = {k: a[1:] for k, a in delta.items()}
+        if len(starts):
+            level['start'] = np.concatenate((level['start'], starts))
+            for k, a in delta.items():
+                level[k] = np.concatenate((level[k], a))
+
+    def _span(self, name, start, end):
+        # Buckets overlapping [start, end]; None leaves that side open
+        level = self.levels[name]
+        if level is None:
+            return 0, 0
+        starts = level['start']
+        i = 0 if start is None else np.searchsorted(starts, _to_ns(start) - self.widths[name], side='right')
+        j = len(starts) if end is None else np.searchsorted(starts, _to_ns(end), side='right')
+        return int(i), int(max(i, j))
+
+    def select(self, start, end, pixels):
+        # Coarsest level that still has at least one bucket per pixel; None means plot raw rows
+        for name in reversed(self.names):
+            i, j = self._span(name, start, end)
+            if j - i >= pixels:
+                return name
+        return None
+
+    def view(self, column, start, end, pixels):
+        # Per-bucket count/mean/std/min/max for one column, at most `pixels` buckets wide
+        name = self.select(start, end, pixels)
+        if name is None:
+            return None
+        level = self.levels[name]
+        c = self.columns.index(column)
+        i, j = self._span(name, start, end)
+        starts = level['start'][i:j]
+        parts = {k: level[k][i:j, c] for k in ('count', 'sum', 'sumsq', 'min', 'max')}
+
+        # Merge groups of neighbouring buckets so the result fits the pixel budget
+        group = -(-len(starts) // pixels)
+        if group > 1:
+            firsts = np.arange(0, len(starts), group)
+            starts = starts[firsts]
+            parts = {k: _REDUCE[k].reduceat(a, firsts) for k, a in parts.items()}
+
+        count = parts['count']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = parts['sum'] / count
+            var = (parts['sumsq'] - parts['sum'] * mean) / (count - 1)
+        frame = pd.DataFrame({
+            'count': count,
+            'mean': mean,
+            'std': np.sqrt(np.clip(var, 0, None)),
+            'min': np.where(count > 0, parts['min'], np.nan),
+            'max': np.where(count > 0, parts['max'], np.nan),
+        }, index=pd.to_datetime(starts))
+        frame.attrs['level'] = name
+        return frame
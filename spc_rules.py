@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+NELSON_RULES = {
+    1: 'Rule 1: 1 point beyond 3σ',
+    2: 'Rule 2: 9 in a row on one side of mean',
+    3: 'Rule 3: 6 in a row increasing or decreasing',
+    4: 'Rule 4: 14 in a row alternating up/down',
+    5: 'Rule 5: 2 of 3 beyond 2σ (same side)',
+    6: 'Rule 6: 4 of 5 beyond 1σ (same side)',
+    7: 'Rule 7: 15 in a row within 1σ',
+    8: 'Rule 8: 8 in a row beyond 1σ (either side)',
+}
+
+# Longest window any rule looks back over; chunks overlap by this many rows
+RULE_LOOKBACK = 14
+RULE_CHUNK_ROWS = 1_000_000
+
+
+def _rolling_count(cond, k):
+    # Number of True rows in the trailing k-row window; rows without a full window count as 0
+    cs = np.cumsum(cond, axis=0, dtype='int32')
+    out = cs.copy()
+    out[k:] -= cs[:-k]
+    out[:k - 1] = 0
+    return out
+
+
+def nelson_flags(values, center, sigma):
+    # values: (rows, columns) float array; center/sigma: per-column arrays.
+    # Returns {rule: bool array shaped like values}, flagged at the last point of each pattern.
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = (values - center) / sigma
+    diff = np.full_like(values, np.nan)
+    diff[1:] = values[1:] - values[:-1]
+    turn = np.zeros(values.shape, dtype=bool)
+    turn[1:] = diff[1:] * diff[:-1] < 0
+
+    return {
+        1: np.abs(z) > 3,
+        2: (_rolling_count(z > 0, 9) == 9) | (_rolling_count(z < 0, 9) == 9),
+        3: (_rolling_count(diff > 0, 5) == 5) | (_rolling_count(diff < 0, 5) == 5),
+        4: _rolling_count(turn, 12) == 12,
+        5: (_rolling_count(z > 2, 3) >= 2) | (_rolling_count(z < -2, 3) >= 2),
+        6: (_rolling_count(z > 1, 5) >= 4) | (_rolling_count(z < -1, 5) >= 4),
+        7: _rolling_count(np.abs(z) < 1, 15) == 15,
+        8: _rolling_count(np.abs(z) > 1, 8) == 8,
+    }
+
+
+def nelson_counts(blocks, center, sigma):
+    # Violation counts per rule (rows) and column (columns) over consecutive (rows, columns)
+    # float arrays, one vectorized pass per block. Each block is evaluated with the previous
+    # block's last rows in front so patterns spanning the boundary are found.
+    counts = np.zeros((len(NELSON_RULES), len(center)), dtype='int64')
+    tail = None
+    for block in blocks:
+        lead = 0 if tail is None else len(tail)
+        values = block if tail is None else np.concatenate((tail, block))
+        flags = nelson_flags(values, center, sigma)
+        for r, rule in enumerate(NELSON_RULES):
+            counts[r] += flags[rule][lead:].sum(axis=0)
+        tail = values[-RULE_LOOKBACK:]
+    return counts
+
+
+def nelson_violations(frame, columns, center=None, sigma=None, chunk_rows=RULE_CHUNK_ROWS):
+    # Violation counts as a DataFrame, over the frame in chunk_rows chunks.
+    # Limits default to each column's mean and standard deviation over the frame.
+    data = frame[columns]
+    # Limits are accumulated in float64 even when the frame stores float32
+    if center is None:
+        center = np.array([data[c].astype('float64').mean() for c in columns])
+    if sigma is None:
+        sigma = np.array([data[c].astype('float64').std() for c in columns])
+    blocks = (data.iloc[start:start + chunk_rows].to_numpy(dtype='float64') for start in range(0, len(data), chunk_rows))
+    return pd.DataFrame(nelson_counts(blocks, center, sigma), index=list(NELSON_RULES.values()), columns=columns)